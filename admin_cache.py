@@ -0,0 +1,89 @@
+"""Per-chat cache of chat administrators.
+
+Lookups return a set of admin user ids straight from memory. Entries older
+than the TTL are still served while a background task refreshes them, and
+chat member updates from Telegram patch entries as soon as someone is
+promoted or demoted, so the hot path never waits for the Bot API.
+"""
+
+import asyncio
+from time import monotonic
+
+from telegram import ChatMember
+
+from logger import log_action as log
+
+
+ADMIN_STATUSES = (ChatMember.ADMINISTRATOR, ChatMember.OWNER)
+
+
+class AdminCache:
+    def __init__(self, ttl):
+        self.ttl = ttl  # Seconds after which an entry is refreshed in the background
+        self.entries = {}  # chat_id -> (frozenset of admin user ids, fetched_at)
+        self.refreshing = {}  # chat_id -> running refresh task
+        self.hits = 0
+        self.misses = 0
+
+    async def fetch(self, bot, chat_id):
+        """Fetch the admins of a chat from the Bot API and store them."""
+        admins = await bot.get_chat_administrators(chat_id)
+        admin_ids = frozenset(admin.user.id for admin in admins)
+        self.entries[chat_id] = (admin_ids, monotonic())
+        return admin_ids
+
+    async def _refresh(self, bot, chat_id):
+        try:
+            await self.fetch(bot, chat_id)
+        except Exception as e:
+            log("bot handler", f"Failed to refresh admins of {chat_id}: {e}", chat=chat_id)
+        finally:
+            self.refreshing.pop(chat_id, None)
+
+    async def get(self, bot, chat_id):
+        """
+        Return the admin user ids of a chat.
+
+        Only the first lookup of a chat waits for the Bot API, stale entries
+        are returned as is and refreshed in the background.
+        """
+        entry = self.entries.get(chat_id)
+        if entry is None:
+            self.misses += 1
+            return await self.fetch(bot, chat_id)
+
+        self.hits += 1
+        admin_ids, fetched_at = entry
+        if monotonic() - fetched_at > self.ttl and chat_id not in self.refreshing:
+            self.refreshing[chat_id] = asyncio.create_task(self._refresh(bot, chat_id))
+        return admin_ids
+
+    def update_member(self, chat_id, user_id, status):
+        """Apply a chat member status change to a cached entry."""
+        entry = self.entries.get(chat_id)
+        if entry is None:
+            return
+        admin_ids, fetched_at = entry
+        if status in ADMIN_STATUSES:
+            admin_ids = admin_ids | {user_id}
+        else:
+            admin_ids = admin_ids - {user_id}
+        self.entries[chat_id] = (admin_ids, fetched_at)
+
+    def invalidate(self, chat_id):
+        """Forget a chat, its admins are fetched again on next lookup."""
+        self.entries.pop(chat_id, None)
+
+    def evict(self, max_age):
+        """
+        Drop entries not refreshed for max_age seconds.
+
+        Returns:
+            int: Number of evicted entries.
+        """
+        now = monotonic()
+        stale = [chat_id for chat_id, (_, fetched_at) in self.entries.items()
+                 if now - fetched_at > max_age]
+        for chat_id in stale:
+            del self.entries[chat_id]
+        return len(stale)
@@ -0,0 +1,80 @@
+"""Fan-out of lesson alerts to every subscribed group.
+
+An alert has only two variants, plain and verbose, so both are rendered
+once per slot, ideally a minute ahead by a separate job, and every group
+gets one of the prepared texts. Sends run concurrently under a bounded
+semaphore, the outbox then paces them to Telegram's limits.
+"""
+
+import asyncio
+
+import fetch_schedule
+from logger import log_action as log
+
+
+class AlertFanout:
+    def __init__(self, render, concurrency=32):
+        """
+        Parameters:
+            render (function): Takes (details, info) and returns the alert text,
+                or a false value if there is nothing to send.
+            concurrency (int): Max alerts being sent at the same time.
+        """
+        self.render = render
+        self.concurrency = concurrency
+        self.semaphore = None  # Created on first fan-out, inside the bot's event loop
+        self.rendered = {}  # details -> (schedule version, {info: text})
+
+    def prepare(self, details):
+        """
+        Render both variants of an alert, unless they are rendered already.
+
+        Parameters:
+            details (tuple): (lesson_index, day_index, week) of the slot.
+
+        Returns:
+            dict: info -> alert text.
+        """
+        version = fetch_schedule.get_schedule_version()
+        cached = self.rendered.get(details)
+        if cached and cached[0] == version:
+            return cached[1]
+
+        # Only the upcoming slot is worth keeping
+        messages = {info: self.render(details, info) for info in (False, True)}
+        self.rendered = {details: (version, messages)}
+        return messages
+
+    async def _deliver(self, send, chat_id, message):
+        async with self.semaphore:
+            try:
+                await send(chat_id, message)
+                return True
+            except Exception as e:
+                log("bot handler", f"Failed to send an alert to {chat_id}: {e}", chat=chat_id)
+                return False
+
+    async def fan_out(self, send, targets, details):
+        """
+        Send an alert to all targets concurrently.
+
+        Parameters:
+            send (function): Coroutine function taking (chat_id, text).
+            targets (list): (chat_id, info) pairs of the subscribed chats.
+            details (tuple): (lesson_index, day_index, week) of the slot.
+
+        Returns:
+            int: Number of chats the alert was sent to.
+        """
+        if self.semaphore is None:
+            self.semaphore = asyncio.Semaphore(self.concurrency)
+
+        messages = self.prepare(details)
+        deliveries = [self._deliver(send, chat_id, messages[bool(info)])
+                      for chat_id, info in targets if messages[bool(info)]]
+        if not deliveries:
+            return 0
+
+        sent = sum(await asyncio.gather(*deliveries))
+        log("bot handler", f"Sent a lesson alert to {sent} of {len(deliveries)} chats")
+        return sent
@@ -0,0 +1,121 @@
+"""Batched autodeletion of bot and user messages.
+
+Every chat session records the messages it may delete later in a
+MessageLedger, together with the time they were sent. A single periodic
+sweep collects the expired ids of every chat and removes them with the
+Bot API deleteMessages call, up to 100 ids per call. Chats are swept
+concurrently under a bounded semaphore, and a failing batch or chat
+doesn't stop the rest of the sweep.
+"""
+
+import asyncio
+from collections import deque
+from time import monotonic
+
+from logger import log_action as log
+
+
+MAX_BATCH = 100  # Max message ids per deleteMessages call
+DELETE_WINDOW = 48 * 60 * 60  # Bots can't delete messages older than this
+
+
+class MessageLedger:
+    """Message ids in the order they were recorded, with the time of recording."""
+
+    def __init__(self):
+        self.entries = deque()  # (message_id, recorded_at)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def append(self, message_id, now=None):
+        self.entries.append((message_id, monotonic() if now is None else now))
+
+    def extend(self, message_ids, now=None):
+        now = monotonic() if now is None else now
+        self.entries.extend((message_id, now) for message_id in message_ids)
+
+    def pop_expired(self, max_age, now=None):
+        """
+        Remove and return the ids recorded at least max_age seconds ago.
+
+        Returns:
+            list: Message ids, oldest first.
+        """
+        now = monotonic() if now is None else now
+        expired = []
+        while self.entries and now - self.entries[0][1] >= max_age:
+            expired.append(self.entries.popleft()[0])
+        return expired
+
+
+class AutoDeleter:
+    def __init__(self, max_age, concurrency=8):
+        self.max_age = max_age  # Seconds a message stays before it is deleted
+        self.concurrency = concurrency  # Chats cleaned up at the same time
+        self.semaphore = None  # Created on first sweep, inside the bot's event loop
+
+        # Counters for monitoring
+        self.stats = {"deleted": 0, "failed": 0, "api_calls": 0}
+
+    async def delete_batch(self, bot, chat_id, message_ids):
+        """
+        Delete messages of a chat in batches of up to MAX_BATCH ids.
+
+        A failed batch is logged and skipped, the remaining batches still run.
+
+        Returns:
+            int: Number of messages in batches that succeeded.
+        """
+        deleted = 0
+        for i in range(0, len(message_ids), MAX_BATCH):
+            batch = message_ids[i:i + MAX_BATCH]
+            self.stats["api_calls"] += 1
+            try:
+                await bot.delete_messages(chat_id, batch)
+                deleted += len(batch)
+            except Exception as e:
+                self.stats["failed"] += len(batch)
+                log("bot handler", f"Failed to delete {len(batch)} messages in {chat_id}: {e}")
+        self.stats["deleted"] += deleted
+        return deleted
+
+    async def _sweep_chat(self, bot, chat_id, message_ids):
+        async with self.semaphore:
+            return await self.delete_batch(bot, chat_id, message_ids)
+
+    async def sweep(self, bot, sessions, now=None):
+        """
+        Delete expired messages in every chat with autodelete enabled.
+
+        Chats with autodelete disabled keep their ledgers, so enabling it
+        later still cleans up, but ids past the deletion window are dropped.
+
+        Parameters:
+            bot: The bot to delete messages with.
+            sessions (list): Chat sessions to sweep.
+
+        Returns:
+            int: Number of deleted messages.
+        """
+        now = monotonic() if now is None else now
+        if self.semaphore is None:
+            self.semaphore = asyncio.Semaphore(self.concurrency)
+        pending = []
+        for session in sessions:
+            ledgers = (session.bot_message_ids, session.user_message_ids)
+            if not session.autodelete:
+                for ledger in ledgers:
+                    ledger.pop_expired(DELETE_WINDOW, now)
+                continue
+
+            message_ids = [message_id for ledger in ledgers
+                           for message_id in ledger.pop_expired(self.max_age, now)]
+            if message_ids:
+                pending.append(self._sweep_chat(bot, session.chat_id, message_ids))
+
+        if not pending:
+            return 0
+        deleted = sum(await asyncio.gather(*pending))
+        log("bot handler", f"Deleted {deleted} messages in {len(pending)} chats")
+        return deleted
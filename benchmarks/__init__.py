@@ -0,0 +1 @@
+"""Benchmarks for CalenBOT, run with python -m benchmarks."""
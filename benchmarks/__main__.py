@@ -0,0 +1,206 @@
+"""Benchmark suite for CalenBOT.
+
+Run from the repository root:
+
+    python -m benchmarks [--save baseline.json] [--compare baseline.json]
+
+Everything runs in a temporary directory with its own database, against
+example_config.py and generated timetables, so the bot's data is never
+touched and no network or Telegram token is needed.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+from benchmarks.synthetic import generate_timetable, timestamps_for
+from benchmarks.fake_bot import FakeBot, FakeContext, FakeJobQueue, make_update
+from benchmarks.harness import measure, measure_async, report, save_baseline, load_baseline
+
+
+CHAT_ID = -1001
+ADMIN_ID = 1001
+USER_ID = 1002
+OVERLORD_ID = 1000
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Run the CalenBOT benchmarks.",
+                                     formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument("--rows", type=int, default=6, help="lesson rows per week table")
+    parser.add_argument("--density", type=float, default=0.6, help="share of cells with a lesson")
+    parser.add_argument("--padding", type=int, default=200, help="unrelated markup blocks on the page")
+    parser.add_argument("--groups", type=int, default=1000, help="approved groups in the database")
+    parser.add_argument("--parser", default=None, help="HTML parser backend, fastest installed by default")
+    parser.add_argument("--repeat", type=int, default=200, help="timed runs per benchmark")
+    parser.add_argument("--only", default=None, help="run benchmarks whose name contains this")
+    parser.add_argument("--save", metavar="PATH", help="write the results to a baseline file")
+    parser.add_argument("--compare", metavar="PATH", help="compare the results with a baseline file")
+    settings = parser.parse_args()
+
+    # Resolve paths before changing into the scratch directory
+    for option in ("save", "compare"):
+        if getattr(settings, option):
+            setattr(settings, option, os.path.abspath(getattr(settings, option)))
+    return settings
+
+
+def setup_environment():
+    """Run from a scratch directory with example_config as the config."""
+    sys.path.insert(0, REPO_ROOT)
+    os.chdir(tempfile.mkdtemp(prefix="calenbot-bench-"))
+    os.makedirs("data")
+
+    import example_config
+    example_config.OVERLORD_USER_ID = str(OVERLORD_ID)
+    sys.modules["config"] = example_config
+
+    import logger  # Opens data/bot.log, so only after changing directory
+    logging.getLogger().setLevel(logging.WARNING)
+
+
+def serve_pages(pages):
+    """
+    Serve generated pages on localhost, /static always returns the first one,
+    /changing cycles through all of them so every scrape sees a change.
+
+    Returns:
+        str: The base URL.
+    """
+    counter = iter(range(sys.maxsize))
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            page = pages[0] if self.path == "/static" else pages[next(counter) % len(pages)]
+            body = page.encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_port}"
+
+
+def schedule_benchmarks(settings, url):
+    import config
+    import fetch_schedule
+    import group_handler
+    from messages import MessageRenderer
+    from timeslots import TimeSlots
+
+    bench = {}
+    tables, types = config.TABLE_IDS, config.LESSON_TYPES
+
+    bench["extract_and_save_schedule (changed)"] = lambda: fetch_schedule.extract_and_save_schedule(
+        url + "/changing", tables, types, settings.parser)
+    bench["extract_and_save_schedule (unchanged)"] = lambda: fetch_schedule.extract_and_save_schedule(
+        url + "/static", tables, types, settings.parser)
+
+    fetch_schedule.extract_and_save_schedule(url + "/static", tables, types, settings.parser)
+    bench["form_schedule (week)"] = lambda: fetch_schedule.form_schedule(config.TEXT, week=1)
+    bench["form_schedule (all)"] = lambda: fetch_schedule.form_schedule(config.TEXT)
+    bench["form_schedule (cold index)"] = lambda: (fetch_schedule.invalidate_schedule_index(),
+                                                   fetch_schedule.form_schedule(config.TEXT))
+
+    renderer = MessageRenderer(config.TEXT, TimeSlots(config.TIMESTAMPS, config.LESSON_LENGTH,
+                                                      config.ALERT_LEAD, config.TIMEZONE),
+                               maxsize=config.MESSAGE_CACHE_SIZE)
+    for name, msg_type in (("now", 0), ("today", 1), ("week", 2), ("all", 3)):
+        bench[f"form_message ({name})"] = lambda msg_type=msg_type: renderer.render(msg_type)
+        bench[f"form_message ({name}, uncached)"] = lambda msg_type=msg_type: (
+            renderer.cache.clear(), renderer.render(msg_type))
+
+    with_data = [(str(-2000 - i), json.dumps({"respond": True, "use_info": i % 2 == 0,
+                                              "scheduler": i % 3 == 0}))
+                 for i in range(settings.groups)]
+    for group_name, group_data in with_data:
+        group_handler.add_group(group_name, group_data)
+    bench[f"get_groups_as_dict ({settings.groups} groups)"] = group_handler.get_groups_as_dict
+
+    return {name: (lambda func=func: measure(func, repeat=settings.repeat)) for name, func in bench.items()}
+
+
+def handler_benchmarks(settings, loop):
+    import core
+    import group_handler
+    from outbox import Outbox
+    from rate_limiter import RateLimiter
+
+    # Pacing and rate limits would measure the limits instead of the handlers
+    unlimited = 10 ** 9
+    core.rate_limiter = RateLimiter(unlimited, unlimited, unlimited, 60)
+    core.sender = Outbox(global_rate=unlimited, group_rate=unlimited, private_rate=unlimited,
+                         burst=unlimited)
+
+    bot = FakeBot(admins={CHAT_ID: [ADMIN_ID]})
+    context = FakeContext(bot, FakeJobQueue())
+    group_handler.add_group(CHAT_ID)
+
+    async def start():
+        core.sender.start(bot)
+    loop.run_until_complete(start())
+
+    def handler(func, user_id, text):
+        async def run():
+            await func(make_update(CHAT_ID, user_id, text), context)
+        return lambda: measure_async(run, loop, repeat=settings.repeat)
+
+    return {
+        "core.schedule_now": handler(core.schedule_now, USER_ID, "/now"),
+        "core.schedule_today": handler(core.schedule_today, USER_ID, "/today"),
+        "core.schedule_this_week": handler(core.schedule_this_week, USER_ID, "/week"),
+        "core.schedule_all": handler(core.schedule_all, USER_ID, "/all"),
+        "core.toggle_info (admin)": handler(core.toggle_info, ADMIN_ID, "/verbose"),
+        "core.unknown": handler(core.unknown, USER_ID, "/nope"),
+    }
+
+
+def main():
+    settings = parse_args()
+    setup_environment()
+
+    import config
+    timestamps = timestamps_for(settings.rows)
+    pages = [generate_timetable(config.TABLE_IDS, config.WEEKDAYS, timestamps, config.LESSON_TYPES,
+                                density=settings.density, padding=settings.padding, seed=seed)
+             for seed in (1, 2)]
+    url = serve_pages(pages)
+
+    loop = asyncio.new_event_loop()
+    benchmarks = schedule_benchmarks(settings, url)
+    benchmarks.update(handler_benchmarks(settings, loop))
+
+    results = {}
+    for name, run in benchmarks.items():
+        if settings.only and settings.only not in name:
+            continue
+        results[name] = run()
+        print(f"{name}: p50 {results[name]['p50_ms']:.3f} ms", file=sys.stderr)
+
+    # Replies are still being sent in the background, stop the outbox before the loop goes away
+    import core
+    loop.run_until_complete(core.sender.close())
+    loop.close()
+
+    baseline = load_baseline(settings.compare) if settings.compare else None
+    print(report(results, baseline))
+    if settings.save:
+        save_baseline(settings.save, results, vars(settings))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""Stand-ins for the Bot API, so handlers run without a network."""
+
+import asyncio
+import itertools
+from datetime import datetime, timezone
+
+from telegram import Chat, Message, Update, User
+
+
+class FakeBot:
+    """Implements the Bot methods the handlers call, with an optional simulated round-trip."""
+
+    def __init__(self, admins=None, latency=0.0):
+        self.id = 1
+        self.admins = admins or {}  # chat_id -> admin user ids
+        self.latency = latency  # Seconds every call takes
+        self.calls = 0
+        self.message_ids = itertools.count(1)
+
+    async def _call(self):
+        self.calls += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+    async def send_message(self, chat_id, text, **kwargs):
+        await self._call()
+        return Message(next(self.message_ids), datetime.now(timezone.utc),
+                       Chat(chat_id, Chat.GROUP), text=text)
+
+    async def delete_messages(self, chat_id, message_ids, **kwargs):
+        await self._call()
+        return True
+
+    async def get_chat_administrators(self, chat_id, **kwargs):
+        await self._call()
+        return tuple(type("ChatMember", (), {"user": User(user_id, "Admin", False)})()
+                     for user_id in self.admins.get(chat_id, ()))
+
+    async def set_my_commands(self, *args, **kwargs):
+        await self._call()
+        return True
+
+
+class FakeJobQueue:
+    """Accepts jobs and never runs them."""
+
+    def __init__(self):
+        self.jobs = []
+
+    def _add(self, callback, **kwargs):
+        job = type("Job", (), {"callback": callback, "schedule_removal": lambda self: None, **kwargs})()
+        self.jobs.append(job)
+        return job
+
+    def run_once(self, callback, when, **kwargs):
+        return self._add(callback, when=when, **kwargs)
+
+    def run_repeating(self, callback, interval, **kwargs):
+        return self._add(callback, interval=interval, **kwargs)
+
+    def run_daily(self, callback, time, **kwargs):
+        return self._add(callback, time=time, **kwargs)
+
+    def get_jobs_by_name(self, name):
+        return tuple(job for job in self.jobs if getattr(job, "name", None) == name)
+
+
+class FakeContext:
+    def __init__(self, bot, job_queue=None, args=None):
+        self.bot = bot
+        self.job_queue = job_queue or FakeJobQueue()
+        self.args = args or []
+        self.job = None
+
+
+_update_ids = itertools.count(1)
+
+
+def make_update(chat_id, user_id, text):
+    """A group message update as python-telegram-bot would deliver it."""
+    message = Message(next(_update_ids), datetime.now(timezone.utc), Chat(chat_id, Chat.GROUP),
+                      from_user=User(user_id, "User", False), text=text)
+    return Update(next(_update_ids), message=message)
@@ -0,0 +1,115 @@
+"""Timing, allocation tracking and baseline files for benchmarks."""
+
+import json
+import platform
+import sys
+import tracemalloc
+from datetime import datetime
+from time import perf_counter
+
+
+def percentile(samples, fraction):
+    """Nearest-rank percentile of sorted samples."""
+    index = min(len(samples) - 1, max(0, round(fraction * len(samples)) - 1))
+    return samples[index]
+
+
+def _summary(samples, peak, retained):
+    samples = sorted(samples)
+    return {
+        "runs": len(samples),
+        "mean_ms": sum(samples) / len(samples) * 1000,
+        "p50_ms": percentile(samples, 0.50) * 1000,
+        "p90_ms": percentile(samples, 0.90) * 1000,
+        "p99_ms": percentile(samples, 0.99) * 1000,
+        "max_ms": samples[-1] * 1000,
+        "peak_kib": peak / 1024,  # Highest extra memory held during one call
+        "retained_kib": retained / 1024,  # Memory still held after all traced calls
+    }
+
+
+def measure(func, repeat=200, warmup=5, traced=20):
+    """
+    Time a function and track its allocations.
+
+    Timing and tracing run separately, tracemalloc would slow the timed runs down.
+
+    Parameters:
+        func (function): Called without arguments.
+        repeat (int): Timed runs.
+        warmup (int): Untimed runs first, to fill caches and connections.
+        traced (int): Runs under tracemalloc.
+
+    Returns:
+        dict: Latency percentiles in milliseconds and memory in KiB.
+    """
+    for _ in range(warmup):
+        func()
+
+    samples = []
+    for _ in range(repeat):
+        started = perf_counter()
+        func()
+        samples.append(perf_counter() - started)
+
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    peak = 0
+    for _ in range(traced):
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        func()
+        peak = max(peak, tracemalloc.get_traced_memory()[1] - before)
+    retained = tracemalloc.get_traced_memory()[0] - baseline
+    tracemalloc.stop()
+
+    return _summary(samples, peak, retained)
+
+
+def measure_async(coro_func, loop, repeat=200, warmup=5, traced=20):
+    """Like measure, for a coroutine function run to completion on loop."""
+    return measure(lambda: loop.run_until_complete(coro_func()), repeat, warmup, traced)
+
+
+def report(results, baseline=None, threshold=1.2):
+    """
+    Format results as a table, compared with a baseline if given.
+
+    Parameters:
+        results (dict): name -> measure result.
+        baseline (dict, optional): A loaded baseline file.
+        threshold (float): p50 ratio above which a benchmark is flagged as slower.
+
+    Returns:
+        str: The report.
+    """
+    old = (baseline or {}).get("results", {})
+    width = max(len(name) for name in results)
+    lines = [f"{'benchmark':<{width}}  {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9} {'peak KiB':>9}"
+             + ("  vs baseline" if baseline else "")]
+    for name, result in results.items():
+        line = (f"{name:<{width}}  {result['p50_ms']:>9.3f} {result['p90_ms']:>9.3f} "
+                f"{result['p99_ms']:>9.3f} {result['peak_kib']:>9.1f}")
+        if name in old and old[name]["p50_ms"]:
+            ratio = result["p50_ms"] / old[name]["p50_ms"]
+            line += f"  x{ratio:.2f}" + ("  SLOWER" if ratio > threshold else "")
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def save_baseline(path, results, settings):
+    """Write results with enough context to tell runs apart."""
+    data = {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "settings": settings,
+        "results": results,
+    }
+    with open(path, "w") as f:
+        json.dump(data, f, indent=2, sort_keys=True)
+
+
+def load_baseline(path):
+    with open(path) as f:
+        return json.load(f)
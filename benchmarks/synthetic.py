@@ -0,0 +1,64 @@
+"""Synthetic timetables for benchmarks.
+
+Pages mimic the structure the scrapers expect: one table per week, a
+header row of weekdays, and one row per lesson start, with the subject
+in span.disLabel and teachers and the lesson type in a.plainLink.
+"""
+
+import random
+
+
+def timestamps_for(rows):
+    """Lesson start times, 1h55m apart from 08:30 like the default timetable, wrapping past midnight."""
+    times = []
+    minutes = 8 * 60 + 30
+    for _ in range(rows):
+        times.append(f"{minutes // 60 % 24:02d}:{minutes % 60:02d}")
+        minutes += 115
+    return times
+
+
+def generate_timetable(table_ids, weekdays, timestamps, lesson_types, density=0.6,
+                       subjects=12, teachers=20, padding=0, seed=1):
+    """
+    Generate a schedule page.
+
+    Parameters:
+        table_ids (list): IDs of the week tables, "First" in an ID marks week 1.
+        weekdays (list): Weekday names for the header row.
+        timestamps (list): Lesson start times, one row each.
+        lesson_types (list): Lesson types to pick from.
+        density (float): Share of cells that have a lesson.
+        subjects (int): Number of distinct subjects.
+        teachers (int): Number of distinct teachers.
+        padding (int): Unrelated markup blocks added around the tables, like a real page has.
+        seed (int): Random seed, the same seed gives the same page.
+
+    Returns:
+        str: The HTML page.
+    """
+    rng = random.Random(seed)
+    out = ["<html><head><title>Schedule</title></head><body>"]
+    out.extend(f'<div class="nav"><a href="/p{i}">Link {i}</a><span>{i}</span></div>'
+               for i in range(padding))
+
+    for table_id in table_ids:
+        out.append(f'<table id="{table_id}"><tr><td>Пара</td>')
+        out.extend(f"<td>{weekday}</td>" for weekday in weekdays)
+        out.append("</tr>")
+        for number, timestamp in enumerate(timestamps, 1):
+            out.append(f"<tr><td>{number}{timestamp}</td>")
+            for _ in weekdays:
+                if rng.random() >= density:
+                    out.append("<td></td>")
+                    continue
+                subject = f"Subject_{rng.randint(1, subjects)}"
+                names = "".join(f'<a class="plainLink" href="#">Teacher {rng.randint(1, teachers)}</a>, '
+                                for _ in range(rng.randint(1, 2)))
+                out.append(f'<td><span class="disLabel"><a class="plainLink" href="#">{subject}</a></span>'
+                           f'<br>{names}<a class="plainLink" href="#">онлайн {rng.choice(lesson_types)}</a></td>')
+            out.append("</tr>")
+        out.append("</table>")
+
+    out.append("</body></html>")
+    return "".join(out)
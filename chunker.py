@@ -0,0 +1,71 @@
+"""Splitting long messages to fit Telegram's length limit.
+
+Rendered schedules are made of day blocks separated by an empty line,
+and every line is a complete piece of Markdown. Messages are split
+between days where possible and between lines otherwise, so no chunk
+ever cuts a Markdown entity in half.
+"""
+
+# Telegram's limit on the text of a message, in UTF-16 code units
+MESSAGE_LIMIT = 4096
+
+
+def message_length(text):
+    """Length of a text as Telegram counts it."""
+    return len(text.encode("utf-16-le")) // 2
+
+
+def _pack(parts, separator, limit):
+    """Greedily join parts into as few chunks as fit the limit, parts must fit on their own."""
+    chunks = []
+    current = ""
+    for part in parts:
+        candidate = current + separator + part if current else part
+        if current and message_length(candidate) > limit:
+            chunks.append(current)
+            current = part
+        else:
+            current = candidate
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def _split_long(text, limit):
+    """Cut a single line that doesn't fit, as a last resort."""
+    chunks = []
+    while message_length(text) > limit:
+        cut = limit
+        while message_length(text[:cut]) > limit:
+            cut -= 1
+        chunks.append(text[:cut])
+        text = text[cut:]
+    return chunks + [text] if text else chunks
+
+
+def split_message(text, limit=MESSAGE_LIMIT):
+    """
+    Split a message into chunks that fit the length limit.
+
+    Parameters:
+        text (str): The message, days separated by an empty line.
+        limit (int): Largest chunk length.
+
+    Returns:
+        list: The chunks in order, a single one if the message fits.
+    """
+    if message_length(text) <= limit:
+        return [text]
+
+    parts = []
+    for day in text.split("\n\n"):
+        if message_length(day) <= limit:
+            parts.append(day)
+            continue
+        # A day that doesn't fit on its own is split between lines
+        lines = []
+        for line in day.split("\n"):
+            lines += [line] if message_length(line) <= limit else _split_long(line, limit)
+        parts += _pack(lines, "\n", limit)
+
+    return [chunk for chunk in _pack(parts, "\n\n", limit) if chunk.strip()]
@@ -6,16 +6,43 @@ bot.
 """
 
 # Importing General modules
-from datetime import datetime, timedelta, time
-from collections import deque
+import startup_timer
 import argparse
+import asyncio
 from functools import wraps
 import sys
+from time import time
 
 # Importing Project-specific modules
+import logger
 from logger import log_action as log
 import config
+import example_config
 import group_handler
+import fetch_schedule
+import db
+from schedule_refresher import ScheduleRefresher
+from session import SessionStore
+from rate_limiter import RateLimiter
+from admin_cache import AdminCache
+from autodelete import AutoDeleter
+import outbox
+from lesson_scheduler import LessonScheduler
+from alert_fanout import AlertFanout
+import metrics
+import chunker
+import inline_results
+from messages import MessageRenderer, MESSAGE_NOW, MESSAGE_TODAY, MESSAGE_WEEK, MESSAGE_ALL
+from timeslots import TimeSlots
+from instrumented_request import InstrumentedRequest
+from http_server import HTTPServer
+from webhook import Webhook
+startup_timer.mark("project modules")
+
+# A config.py copied from an older example_config.py lacks the settings added since, they keep their defaults
+for setting in dir(example_config):
+    if setting.isupper() and not hasattr(config, setting):
+        setattr(config, setting, getattr(example_config, setting))
 
 # Importing python-telegram-bot modules
 
@@ -26,7 +53,7 @@ try:
 except ImportError:
     __version_info__ = (0, 0, 0, 0, 0)  # type: ignore[assignment]
 
-if __version_info__ < (20, 0, 0, "alpha", 1):
+if __version_info__ < (20, 8, 0, "final", 0):
     raise RuntimeError(
         f"This bot is not compatible with your current PTB version {TG_VER}."
     )
@@ -42,23 +69,23 @@ from telegram.ext import (
     CommandHandler,
     ContextTypes,
     CallbackContext,
+    ChatMemberHandler,
+    InlineQueryHandler,
     MessageHandler,
     filters,
 )
+startup_timer.mark("telegram modules")
 
 parser = argparse.ArgumentParser(description="There should be a help intro.",
                                  formatter_class=argparse.ArgumentDefaultsHelpFormatter)
 parser.add_argument("-f", "--fill-none-values", action="store_true",
                     help="update db with new values")
-args = parser.parse_args()
+parser.add_argument("-b", "--blocking-scrape", action="store_true",
+                    help="scrape the schedule before starting the bot instead of in the background")
+parser.add_argument("-w", "--webhook", action="store_true",
+                    help="receive updates on a webhook instead of polling, see WEBHOOK_* in the config")
 
 
-# Constants
-MESSAGE_NOW = 0
-MESSAGE_TODAY = 1
-MESSAGE_WEEK = 2
-MESSAGE_ALL = 3
-
 # Define common, admin, and overlord commands
 COMMON_COMMANDS = [
     BotCommand("now", "Показати яка зараз пара та наступну"),
@@ -78,52 +105,71 @@ OVERLORD_COMMANDS = ADMIN_COMMANDS + [
     BotCommand("start_scheduler", "Start schedule"),
     BotCommand("stop_scheduler", "Stop schedule"),
     BotCommand("start", "Welcome message"),
-    BotCommand("autodelete", "Create a job to delete bot messages and user commands")
+    BotCommand("autodelete", "Create a job to delete bot messages and user commands"),
+    BotCommand("stats", "Show runtime metrics")
 ]
 
-class BotSession:
-    def __init__(self):
-        self.overlord = config.OVERLORD_USER_ID  # Admin user ID
-        self.text = config.TEXT  # Text templates for bot messages
-
-        # Deque to hold timestamps for rate-limiting
-        self.global_time_stamps = deque()
-
-        self.scheduled_jobs = None  # Holds the scheduled job objects
-        self.request_time = config.REQUEST_TIME  # Time window for rate-limiting
-        self.max_request = config.MAX_REQUEST  # Max requests in time window
-
-        # Scheduler settings
-        self.start = config.START  # Scheduler start time
-        self.interval = config.INTERVAL  # Scheduler interval
-        self.end = config.END  # Scheduler end time
-
-        self.respond = True  # Toggle for bot to respond to user requests
-        self.use_info = False  # Toggle for extra info in scheduled requests
-        self.autodelete = False # Toggle to automatically delete message
-        self.autodelete_job = None
-        self.autodelete_interval = config.AUTODELETE
-
-        self.chat_info = {} # Store all chat info for future use
-        self.bot_message_ids = []  # Store bot's message IDs for deletion
-        self.user_message_ids = []  # Store user's message IDs for deletion
-
-    def get_chat_id(self, chat_id=None):
-        # Get the chat ID, default to current group if not specified
-        chat_id = chat_id if chat_id else str(self.chat_info["chat_id"])
-
-        # Fetch group data from database
-        group_dict = group_handler.get_groups_as_dict()
-
-        # Check if chat ID exists in group data
-        if str(chat_id) not in group_dict.keys():
-            return False
-
-        # Set current group chat ID
-        self.chat_info["chat_id"] = chat_id
-        return chat_id
-
-session = BotSession()
+# Global bot settings
+OVERLORD = config.OVERLORD_USER_ID  # Admin user ID
+TEXT = config.TEXT  # Text templates for bot messages
+
+# Schedule messages, cached until the schedule or the lesson slot changes
+renderer = MessageRenderer(TEXT, TimeSlots(config.TIMESTAMPS, config.LESSON_LENGTH, config.ALERT_LEAD, config.TIMEZONE),
+                           maxsize=config.MESSAGE_CACHE_SIZE)
+
+# Per-chat state, created on first use and evicted when idle
+sessions = SessionStore(max_idle=config.SESSION_IDLE, max_sessions=config.MAX_SESSIONS)
+
+# Token buckets for the whole bot, every chat and every user in a chat
+rate_limiter = RateLimiter(user_limit=config.MAX_REQUEST,
+                           chat_limit=config.CHAT_MAX_REQUEST,
+                           global_limit=config.GLOBAL_MAX_REQUEST,
+                           period=config.REQUEST_TIME * 60)
+
+# Admin IDs per chat, refreshed in the background and patched by chat member updates
+admin_cache = AdminCache(ttl=config.ADMIN_CACHE_TTL)
+
+# Deletes expired messages of all chats in batches
+autodeleter = AutoDeleter(max_age=config.AUTODELETE, concurrency=config.AUTODELETE_CONCURRENCY)
+
+# Every outgoing message goes through this queue, paced to Telegram's flood limits
+sender = outbox.Outbox(global_rate=config.SEND_GLOBAL_RATE,
+                       group_rate=config.SEND_GROUP_RATE,
+                       private_rate=config.SEND_PRIVATE_RATE,
+                       burst=config.SEND_BURST,
+                       max_retries=config.SEND_MAX_RETRIES)
+
+# Lesson alerts, rendered once per slot and sent to all subscribed chats at once
+alerts = AlertFanout(render=lambda details, info: render_alert(details, info),
+                     concurrency=config.ALERT_CONCURRENCY)
+
+# Inline lookups, result sets built once per rendered message
+inline = inline_results.InlineResults(render=lambda msg_type, week: render_inline(msg_type, week),
+                                      titles=getattr(TEXT, "inline_titles", example_config.TEXT.inline_titles), maxsize=config.INLINE_CACHE_SIZE)
+
+# Gauges are read from the objects above only when metrics are requested
+metrics.registry.gauge("calenbot_message_cache_hit_ratio",
+                       lambda: metrics.ratio(renderer.cache.hits, renderer.cache.misses),
+                       "Share of rendered messages served from the cache.")
+metrics.registry.gauge("calenbot_admin_cache_hit_ratio",
+                       lambda: metrics.ratio(admin_cache.hits, admin_cache.misses),
+                       "Share of admin lookups served without a Bot API call.")
+metrics.registry.gauge("calenbot_inline_cache_hit_ratio",
+                       lambda: metrics.ratio(inline.cache.hits, inline.cache.misses),
+                       "Share of inline queries answered with prebuilt results.")
+metrics.registry.gauge("calenbot_rate_limiter_requests",
+                       lambda: {(("result", result),): count for result, count in rate_limiter.stats.items()},
+                       "Requests by rate limiter decision since start.")
+metrics.registry.gauge("calenbot_outbox_messages",
+                       lambda: {(("result", result),): count for result, count in sender.stats.items()},
+                       "Outgoing messages by result since start.")
+metrics.registry.gauge("calenbot_outbox_queued",
+                       lambda: sum(len(queue) for lane in sender.lanes.values() for queue in lane),
+                       "Messages waiting in the outbox.")
+metrics.registry.gauge("calenbot_autodelete_messages",
+                       lambda: {(("result", result),): count for result, count in autodeleter.stats.items()},
+                       "Autodeletion counters since start.")
+metrics.registry.gauge("calenbot_sessions", lambda: len(sessions.sessions), "Chat sessions in memory.")
 
 
 ######################################################################
@@ -161,52 +207,39 @@ def user(func):
 ###################### Helper functions ##############################
 ######################################################################
 
-# Convert time string to datetime.time object with UTC offset
-def get_time_with_utc_offset(time_str: str, utc_offset: int) -> time:
-    """Convert time string to datetime.time with UTC offset."""
-    parsed_time = datetime.strptime(time_str, "%H:%M").time()
-    today = datetime.utcnow().date()
-    combined_time = datetime.combine(today, parsed_time)
-    offset_time = (combined_time + timedelta(hours=utc_offset)).time()
-    return offset_time
-
-# Get chat info like chat_id, user_id, message_id, and chat_admins
-async def get_chat_info(update: Update, context: CallbackContext) -> None:
-    """Retrieve essential chat information."""
-    chat_id = update.effective_chat.id
-    chat_admins = await context.bot.get_chat_administrators(chat_id)
-
-    session.chat_info = {
-        'chat_id': chat_id,
-        'chat_admins': chat_admins
-    }
+# Get the chat administrators from the cache, the Bot API is only hit for unknown chats
+async def get_chat_admins(update: Update, context: CallbackContext) -> frozenset:
+    """Retrieve the administrator IDs of the current chat."""
+    return await admin_cache.get(context.bot, update.effective_chat.id)
 
 # Check if a user is an admin in the group
 def is_admin(user_id, chat_admins) -> bool:
     """Check if user is an admin."""
-    try:
-        return user_id in [admin.user.id for admin in chat_admins]
-    except Exception as e:
-        print(f"Error: {e}")
-        return False
+    return user_id in chat_admins
+
+# Keep cached admin lists in sync with promotions, demotions and leaves
+async def track_chat_admins(update: Update, context: CallbackContext) -> None:
+    """Update the admin cache from chat member updates."""
+    member_update = update.chat_member or update.my_chat_member
+    chat_id = member_update.chat.id
+    member = member_update.new_chat_member
+
+    # The bot itself was removed, nothing in this chat is worth keeping
+    if member.user.id == context.bot.id and member.status in (member.LEFT, member.BANNED):
+        admin_cache.invalidate(chat_id)
+        return
+    admin_cache.update_member(chat_id, member.user.id, member.status)
 
 # Check if the chat_id belongs to an authorized group
 def check_group(chat_id: int) -> bool:
     """Verify if chat is authorized."""
-    return bool(session.get_chat_id(chat_id))
+    return group_handler.is_approved(chat_id)
 
 # Implement rate limiting for bot requests
 # make sure it works only for group and not in private chats!
-def rate_limit() -> bool:
-    """Global rate limiting."""
-    now = datetime.now()
-    time_limit = timedelta(minutes=session.request_time)
-    while session.global_time_stamps and now - session.global_time_stamps[0] > time_limit:
-        session.global_time_stamps.popleft()
-    if len(session.global_time_stamps) >= session.max_request:
-        return False
-    session.global_time_stamps.append(now)
-    return True
+def rate_limit(chat_id: int, user_id: int) -> bool:
+    """Global, per-chat and per-user rate limiting."""
+    return rate_limiter.allow(chat_id, user_id)
 
 # Implement hierarchy using get_permission function
 # must be used in any group/private chat
@@ -223,48 +256,77 @@ def get_permission(kind: str, user_id: int, chat_id: int) -> bool:
 def handle_message(user_id: int, chat_id: int, chat_admins: tuple) -> bool:
     """Handle incoming messages and perform necessary checks."""
 
+    # Check if the chat is authorized
+    if not check_group(chat_id):
+        return "auth"
+
     # If the user is an admin, no further checks are needed
     if is_admin(user_id, chat_admins):
+        return True
 
-        # If the bot is set to not respond, exit early
-        if not session.respond:
-            return False
-
-        # Check if the chat is authorized
-        if not check_group(chat_id):  # Removed 'await' as check_group is not async
-            return "auth"
+    # If the bot is set to not respond, exit early
+    if not sessions.get(chat_id).respond:
+        return False
 
-        # Check for rate limiting
-        if not rate_limit():  # Removed 'await' as rate_limit is not async
-            return "limit"
+    # Check for rate limiting
+    if not rate_limit(chat_id, user_id):
+        return "limit"
 
     return True
 
-async def error_respond_message(context: CallbackContext, type_: str) -> None:
+def reply(chat_id: int, text: str, notice: bool = False, **kwargs) -> None:
+    """
+    Queue a message without waiting for it, its ID is stored for future deletion once it's sent.
+    Handlers never wait for a chat's pacing, so a busy chat can't hold up the others.
+    Notices (errors, unknown commands) are dropped while the chat still has messages waiting.
+    """
+    if notice and sender.queued(chat_id):
+        return
+    sender.enqueue(chat_id, text, **kwargs).add_done_callback(
+        lambda future: remember_sent(chat_id, future))
+
+def remember_sent(chat_id: int, future) -> None:
+    """Store the ID of a sent message for future deletion, log it if sending failed."""
+    if future.cancelled():
+        return
+    if future.exception():
+        log("bot handler", f"Couldn't send a message to {chat_id}: {future.exception()}", chat=chat_id)
+        return
+    # Chats not in memory have autodelete off
+    chat = sessions.peek(chat_id)
+    if chat:
+        chat.bot_message_ids.append(future.result().message_id)
+
+async def error_respond_message(context: CallbackContext, chat_id: int, type_: str) -> None:
     """Send message to notify about certain error or restriction"""
     if type_ == "auth":
-        return await context.bot.send_message(session.chat_info['chat_id'], session.text.no_auth)
+        reply(chat_id, TEXT.no_auth, notice=True)
     elif type_ == "limit":
-        return await context.bot.send_message(session.chat_info['chat_id'], session.text.request_limit)
+        reply(chat_id, TEXT.request_limit, notice=True)
 
 # Notify for unknown commands
 async def unknown(update: Update, context: CallbackContext):
     """Handle unknown commands."""
-    return await context.bot.send_message(update.effective_chat.id,
-                                   text=session.text.unknown_command)
+    reply(update.effective_chat.id, TEXT.unknown_command, notice=True)
 
 # Delete bot and user messages
 async def delete_message(context: CallbackContext):
-    """Delete bot and user messages."""
-    for msg_list in [session.bot_message_ids, session.user_message_ids]:
-        while msg_list:
-            msg_id = msg_list.pop(0)
-            try:
-                await context.bot.delete_message(session.chat_info['chat_id'], msg_id)
-            except Exception as e:
-                log("bot handler", f"Failed to delete message: {e}")
-                break
-    log("bot handler", "Finished deleting messages")
+    """Delete expired bot and user messages in all chats with autodelete enabled."""
+    await autodeleter.sweep(context.bot, sessions.values())
+
+# Evict sessions and rate limit buckets of chats that went quiet
+async def evict_sessions(context: CallbackContext):
+    """Drop idle chat sessions, full rate limit buckets and old admin lists from memory."""
+    evicted = sessions.evict()
+    if evicted:
+        log("bot handler", f"Evicted {evicted} idle chat sessions")
+    rate_limiter.evict()
+    sender.evict()
+    admin_cache.evict(max_age=config.SESSION_IDLE)
+
+async def optimize_database(context: CallbackContext):
+    """Refresh the query planner statistics that went stale."""
+    db.optimize()
 
 # Toggle boolean state
 def toggle_state(state: bool) -> bool:
@@ -283,44 +345,66 @@ def toggle_state(state: bool) -> bool:
 # Start command for the bot
 async def start(update: Update, context: CallbackContext) -> None:
     """Send a welcome message if the user is the overlord."""
+    chat = sessions.get(update.effective_chat.id)
     # Store the user's message ID for future deletion
-    session.user_message_ids.append(update.message.message_id)
+    chat.user_message_ids.append(update.message.message_id)
 
-    if str(update.effective_user.id) != session.overlord:
-        session.bot_message_ids.append((await unknown(update, context)).message_id)
+    if str(update.effective_user.id) != OVERLORD:
+        await unknown(update, context)
         return
-    await context.bot.send_message(
-        update.effective_chat.id, config.get_welcome_message(),
-        disable_web_page_preview=True, parse_mode='MarkdownV2'
-    )
+    reply(update.effective_chat.id, config.get_welcome_message(),
+          disable_web_page_preview=True, parse_mode='MarkdownV2')
 
 # Add commands for different user roles
 async def addcommands(update: Update, context: CallbackContext) -> None:
     """Add bot commands for users, admins, and the overlord."""
+    chat = sessions.get(update.effective_chat.id)
     # Store the user's message ID for future deletion
-    session.user_message_ids.append(update.message.message_id)
+    chat.user_message_ids.append(update.message.message_id)
 
-    if str(update.effective_user.id) != session.overlord:
-        session.bot_message_ids.append((await unknown(update, context)).message_id)
+    if str(update.effective_user.id) != OVERLORD:
+        await unknown(update, context)
         return
     chat_id = update.effective_chat.id
 
     # Set commands for different scopes
     await context.bot.set_my_commands(COMMON_COMMANDS, scope=BotCommandScopeChat(chat_id))
     await context.bot.set_my_commands(ADMIN_COMMANDS, scope=BotCommandScopeChatAdministrators(chat_id))
-    await context.bot.set_my_commands(OVERLORD_COMMANDS, scope=BotCommandScopeChatMember(chat_id, session.overlord))
-    log("bot handler", 'Commands added for administrators.')
+    await context.bot.set_my_commands(OVERLORD_COMMANDS, scope=BotCommandScopeChatMember(chat_id, OVERLORD))
+    log("bot handler", 'Commands added for administrators.', chat=chat_id, command="/commands")
+
+# Show runtime metrics to the overlord
+async def stats(update: Update, context: CallbackContext) -> None:
+    """Send a summary of the runtime metrics."""
+    chat = sessions.get(update.effective_chat.id)
+    # Store the user's message ID for future deletion
+    chat.user_message_ids.append(update.message.message_id)
+
+    if str(update.effective_user.id) != OVERLORD:
+        await unknown(update, context)
+        return
+
+    # Plain text, metric names are full of underscores. A long summary is split between lines
+    for chunk in chunker.split_message(metrics.registry.render_summary() or "No metrics yet"):
+        reply(chat.chat_id, chunk)
+
+async def metrics_endpoint(request) -> tuple:
+    """Serve the metrics in the Prometheus text format."""
+    return 200, "text/plain; version=0.0.4", metrics.registry.render_prometheus()
 
 # General function to manage groups
 async def manage_group(update: Update, context: CallbackContext, action: str) -> None:
     """Add or remove a group based on the action."""
-    if str(update.message.from_user.id) != session.overlord:
-        session.bot_message_ids.append((await unknown(update, context)).message_id)
+    chat = sessions.get(update.effective_chat.id)
+    if str(update.message.from_user.id) != OVERLORD:
+        await unknown(update, context)
         return
     chat_id = update.message.chat_id
 
     if action == "add":
         group_handler.add_group(chat_id)
+        # Keep toggles changed before the group was approved
+        sessions.save(chat)
     elif action == "remove":
         group_handler.remove_group(chat_id)
 
@@ -328,7 +412,7 @@ async def manage_group(update: Update, context: CallbackContext, action: str) ->
 async def add_group(update, context):
     """Wrapper for adding a group."""
     # Store the user's message ID for future deletion
-    session.user_message_ids.append(update.message.message_id)
+    sessions.get(update.effective_chat.id).user_message_ids.append(update.message.message_id)
 
     await manage_group(update, context, "add")
 
@@ -336,240 +420,152 @@ async def add_group(update, context):
 async def remove_group(update, context):
     """Wrapper for removing a group."""
     # Store the user's message ID for future deletion
-    session.user_message_ids.append(update.message.message_id)
+    sessions.get(update.effective_chat.id).user_message_ids.append(update.message.message_id)
 
     await manage_group(update, context, "remove")
 
 async def toggle_autodeletion(update: Update, context: CallbackContext) -> None:
+    chat = sessions.get(update.effective_chat.id)
     # Store the user's message ID for future deletion
-    session.user_message_ids.append(update.message.message_id)
+    chat.user_message_ids.append(update.message.message_id)
 
     """Toggle the verbosity of the bot."""
-    if str(update.message.from_user.id) != session.overlord:
-        session.bot_message_ids.append((await unknown(update, context)).message_id)
+    if str(update.message.from_user.id) != OVERLORD:
+        await unknown(update, context)
         return
 
-    if session.autodelete is None:
-        session.autodelete = []
-
-    # Toggle autodelete
-    session.autodelete = toggle_state(session.autodelete)
-    status = "enabled" if session.autodelete else "disabled"
-    if session.autodelete:
-        if not session.autodelete_job:
-            session.autodelete_job = context.job_queue.run_repeating(
-                        delete_message,
-                        first=0,
-                        interval=session.autodelete_interval,
-            )
-    else:
-        try:
-            session.autodelete_job.schedule_removal()
-        except Exception as e:
-            log("bot handler", f"Failed to remove autodelete job: {e}")
-    log("bot handler", f"Admin has {status} autodelete mode")
+    # Toggle autodelete, the periodic sweep picks the chat up from its session
+    chat.autodelete = toggle_state(chat.autodelete)
+    status = "enabled" if chat.autodelete else "disabled"
+    log("bot handler", f"Admin has {status} autodelete mode", chat=chat.chat_id, command="/autodelete")
 
 async def manage_scheduler(update: Update, context: CallbackContext, action: str) -> None:
     """General function to start or stop the scheduler based on the action parameter."""
-    if str(update.message.from_user.id) != session.overlord:
-        session.bot_message_ids.append((await unknown(update, context)).message_id)
+    chat = sessions.get(update.effective_chat.id)
+    if str(update.message.from_user.id) != OVERLORD:
+        await unknown(update, context)
         return
 
-    # Required for callback_send_message
-    if not session.chat_info:
-        await get_chat_info(update, context)
-
-    # Initialize scheduled_job list if it doesn't exist
-    if session.scheduled_jobs is None:
-        session.scheduled_jobs = []
-
-    # If scheduler was launched after start time, start scheduler one minute later
+    # Alerts are planned once for the whole bot, a chat only subscribes to them
+    command = f"/{action}_scheduler"
     if action == "start":
-        if not session.scheduled_jobs:
-            initial_first = get_time_with_utc_offset(session.start, -3)
-            interval = session.interval
-            last = get_time_with_utc_offset(session.end, -3).replace(tzinfo=None)
-
-            # Create datetime objects for better comparison
-            today = datetime.now().date()
-            now = datetime.now().time()
-            now_with_offset = get_time_with_utc_offset(now.strftime("%H:%M"), -3)
-            now_datetime = datetime.combine(today, now_with_offset).replace(tzinfo=None)
-            first_datetime = datetime.combine(today, initial_first).replace(tzinfo=None)
-            last_datetime = datetime.combine(today, last).replace(tzinfo=None)
-
-            if first_datetime < now_datetime < last_datetime:
-                log("bot handler","Admin launched scheduler later then excpected!")
-                first_datetime = now_datetime + timedelta(minutes=1)
-                first = first_datetime.time()
-                log("bot_handler",f"New first time for today: {first}")
-
-                job_today = context.job_queue.run_repeating(
-                    callback_send_message,
-                    first=first,
-                    last=last,
-                    interval=interval,
-                )
-                session.scheduled_jobs.append(job_today)
-                log("bot handler", "Admin has started a scheduler for today")
-
-                # Set it to start the next day with the initial value
-#                first_datetime = datetime.combine(today + timedelta(days=1), initial_first)
-#                first = first_datetime.time()
-#                log("bot_handler",f"First time for next day: {first}")
-
-                # Schedule job for the next day
-#                job_next_day = context.job_queue.run_repeating(
-#                    callback_send_message,
-#                    first=first,
-#                    interval=interval,
-#                )
-#                session.scheduled_jobs.append(job_next_day)
-#                log("bot handler", "Admin has scheduled a job for the next day")
-#            elif now_datetime > last_datetime:
-#                log("bot handler","Admin launched scheduler after the end of today's schedule!")
-                # Set it to start the next day with the initial value
-#                first_datetime = datetime.combine(today + timedelta(days=1), initial_first)
-#                first = first_datetime.time()
-#                log("bot_handler",f"First time for next day: {first}")
-
-                # Schedule job for the next day
-#                job_next_day = context.job_queue.run_repeating(
-#                    callback_send_message,
-#                    first=first,
-#                    interval=interval,
-#                )
-#                session.scheduled_jobs.append(job_next_day)
-#                log("bot handler", "Admin has scheduled a job for the next day")
-            else:
-                # Regular scheduling logic
-                job_regular = context.job_queue.run_repeating(
-                    callback_send_message,
-                    first=initial_first,
-                    interval=interval,
-                )
-                session.scheduled_jobs.append(job_regular)
-                log("bot handler", "Admin has started a scheduler")
+        if not chat.scheduler:
+            chat.scheduler = True
+            sessions.save(chat)
+            log("bot handler", "Admin has started a scheduler", chat=chat.chat_id, command=command)
         else:
-            log("bot handler", "Scheduler is already running.")
+            log("bot handler", "Scheduler is already running.", chat=chat.chat_id, command=command)
     elif action == "stop":
-        if not session.scheduled_jobs:
-            log("bot_handler", "Scheduler is not running.")
+        if not chat.scheduler:
+            log("bot_handler", "Scheduler is not running.", chat=chat.chat_id, command=command)
             return
-        while session.scheduled_jobs:
-            scheduled_job = session.scheduled_jobs.pop(0)
-            try:
-                scheduled_job.schedule_removal()
-            except Exception as e:
-                log("bot handler", f"Failed to remove a job: {e}")
-        log("bot handler", "Admin has stopped a scheduler")
+        chat.scheduler = False
+        sessions.save(chat)
+        log("bot handler", "Admin has stopped a scheduler", chat=chat.chat_id, command=command)
 
 async def start_scheduler(update: Update, context: CallbackContext) -> None:
     """Start the scheduler."""
     # Store the user's message ID for future deletion
-    session.user_message_ids.append(update.message.message_id)
+    sessions.get(update.effective_chat.id).user_message_ids.append(update.message.message_id)
 
     await manage_scheduler(update, context, "start")
 
 async def stop_scheduler(update: Update, context: CallbackContext) -> None:
     """Stop the scheduler."""
     # Store the user's message ID for future deletion
-    session.user_message_ids.append(update.message.message_id)
+    sessions.get(update.effective_chat.id).user_message_ids.append(update.message.message_id)
 
     await manage_scheduler(update, context, "stop")
 
 async def callback_send_message(context: CallbackContext) -> None:
-    """Reply with info about the current lesson."""
-    chat_id = session.get_chat_id()
-    if not chat_id:
-        return
-
-    info = session.use_info  # This seems to be a boolean, so should be directly usable.
-    message = config.form_message(MESSAGE_NOW, link=True, info=info,
-                                  return_false=True, callback_message=True)
-    if not message:
-        return
-
-    sent_message = await context.bot.send_message(
+    """Send info about the upcoming lesson to every approved chat with the scheduler enabled."""
+    targets = [(chat_id, info) for chat_id, info in sessions.get_subscribers().items()
+               if check_group(chat_id)]
+    await alerts.fan_out(deliver_alert, targets, context.job.data)
+
+async def prepare_alert(context: CallbackContext) -> None:
+    """Render the upcoming alert ahead of time."""
+    alerts.prepare(context.job.data)
+
+def render_alert(time_details: tuple, info: bool) -> str:
+    """Render the alert of a lesson slot."""
+    return renderer.render(MESSAGE_NOW, link=True, info=info, return_false=True,
+                           callback_message=True, time_details=time_details)
+
+async def deliver_alert(chat_id: int, message: str) -> None:
+    """Send a rendered alert to a chat."""
+    sent_message = await sender.send_message(
         chat_id,
         message,
+        priority=outbox.ALERT,
         disable_web_page_preview=True,
         parse_mode='Markdown'
     )
 
-    # Store the bot's message ID for future deletion
-    session.bot_message_ids.append(sent_message.message_id)
+    # Store the bot's message ID for future deletion, chats not in memory have autodelete off
+    chat = sessions.peek(chat_id)
+    if chat:
+        chat.bot_message_ids.append(sent_message.message_id)
 
 ########################## ALL ADMINS ################################
 
 async def toggle_respond(update: Update, context: CallbackContext) -> None:
     """Toggle the bot's ability to respond."""
+    chat = sessions.get(update.effective_chat.id)
     # Store the user's message ID for future deletion
-    session.user_message_ids.append(update.message.message_id)
+    chat.user_message_ids.append(update.message.message_id)
 
     # Retrieve chat and user information
-    if not session.chat_info:
-        await get_chat_info(update, context)
-
-
-    chat_id = session.chat_info['chat_id']
-    chat_admins = session.chat_info['chat_admins']
+    chat_id = chat.chat_id
+    chat_admins = await get_chat_admins(update, context)
     user_id = update.effective_user.id
 
-    if str(update.message.from_user.id) != session.overlord:
+    if str(update.message.from_user.id) != OVERLORD:
         if not check_group(chat_id):
-            session.bot_message_ids.append((await error_respond_message(context,"auth")).message_id)
+            await error_respond_message(context, chat_id, "auth")
             return False
 
         # Check if the user is an admin
         if not is_admin(user_id, chat_admins):
-            session.bot_message_ids.append((await unknown(update, context)).message_id)
+            await unknown(update, context)
             return
 
         # Retrieve the text and status for the deaf mode
-    text, off, on = session.text.deaf_mode
-    session.respond = toggle_state(session.respond)
-    status = (on, "enabled") if not session.respond else (off, "disabled")
-    sent_message = await context.bot.send_message(chat_id,
-                                                      f"{text} {status[0]}")
-    log("bot handler", f"Admin has {status[1]} deaf mode")
-
-        # Store the bot's message ID for future deletion
-    session.bot_message_ids.append(sent_message.message_id)
+    text, off, on = TEXT.deaf_mode
+    chat.respond = toggle_state(chat.respond)
+    sessions.save(chat)
+    status = (on, "enabled") if not chat.respond else (off, "disabled")
+    reply(chat_id, f"{text} {status[0]}")
+    log("bot handler", f"Admin has {status[1]} deaf mode", chat=chat_id, command="/deaf")
 
 async def toggle_info(update: Update, context: CallbackContext) -> None:
     """Toggle the verbosity of the bot."""
+    chat = sessions.get(update.effective_chat.id)
     # Store the user's message ID for future deletion
-    session.user_message_ids.append(update.message.message_id)
+    chat.user_message_ids.append(update.message.message_id)
 
     # Retrieve chat and user information
-    if not session.chat_info:
-        await get_chat_info(update, context)
-
-    chat_id = session.chat_info['chat_id']
-    chat_admins = session.chat_info['chat_admins']
+    chat_id = chat.chat_id
+    chat_admins = await get_chat_admins(update, context)
     user_id = update.effective_user.id
 
-    if str(update.message.from_user.id) != session.overlord:
+    if str(update.message.from_user.id) != OVERLORD:
         if not check_group(chat_id):
-            session.bot_message_ids.append((await error_respond_message(context,"auth")).message_id)
+            await error_respond_message(context, chat_id, "auth")
             return False
 
         # Check if the user is an admin
         if not is_admin(user_id, chat_admins):
-            session.bot_message_ids.append((await unknown(update, context)).message_id)
+            await unknown(update, context)
             return
 
     # Retrieve the text and status for verbose mode
-    text, off, on = session.text.verbose_mode
-    session.use_info = toggle_state(session.use_info)
-    status = (on, "enabled") if session.use_info else (off, "disabled")
-    sent_message = await context.bot.send_message(chat_id,
-                                                      f"{text} {status[0]}")
-    log("bot handler", f"Admin has {status[1]} verbose mode")
-
-    # Store the bot's message ID for future deletion
-    session.bot_message_ids.append(sent_message.message_id)
+    text, off, on = TEXT.verbose_mode
+    chat.use_info = toggle_state(chat.use_info)
+    sessions.save(chat)
+    status = (on, "enabled") if chat.use_info else (off, "disabled")
+    reply(chat_id, f"{text} {status[0]}")
+    log("bot handler", f"Admin has {status[1]} verbose mode", chat=chat_id, command="/verbose")
 
 ### Managing scheduler
 
@@ -579,77 +575,85 @@ async def toggle_info(update: Update, context: CallbackContext) -> None:
 
 async def send_schedule_message(update: Update, context: CallbackContext, message_type: int) -> None:
     """General function to handle sending schedule messages."""
-    # Retrieve chat and user information
-    if not session.chat_info:
-        await get_chat_info(update, context)
+    chat = sessions.get(update.effective_chat.id)
 
-    chat_id = session.chat_info['chat_id']
-    chat_admins = session.chat_info['chat_admins']
+    # Retrieve chat and user information
+    chat_id = chat.chat_id
+    chat_admins = await get_chat_admins(update, context)
     user_id = update.effective_user.id
 
-    if str(update.message.from_user.id) != session.overlord:
+    if str(update.message.from_user.id) != OVERLORD:
 
         handled_message = handle_message(user_id=user_id,chat_id=chat_id, chat_admins=chat_admins)
 
-        if not check_group(chat_id):
-            session.bot_message_ids.append((await error_respond_message(context,"auth")).message_id)
-            return False
-
         if not handled_message:
             return
 
         elif handled_message in ("auth", "limit"):
-            session.bot_message_ids.append((await error_respond_message(context, handled_message)).message_id)
+            await error_respond_message(context, chat_id, handled_message)
             return
 
-    info = session.use_info  # This appears to be a boolean, so it should be directly usable
-    message = config.form_message(message_type, link=info, info=info)
-    message_ids = []
-
-    if message_type == MESSAGE_ALL:
-        week_messages = message.split("%%")
-        for msg in week_messages:
-            sent_message = await context.bot.send_message(chat_id, msg,
-                                           disable_web_page_preview=True,
-                                           parse_mode='Markdown')
-            message_ids.append(sent_message.message_id)
-    else:
-        sent_message = await context.bot.send_message(chat_id, message,
-                                       disable_web_page_preview=True,
-                                       parse_mode='Markdown')
-        message_ids.append(sent_message.message_id)
+    info = chat.use_info  # This appears to be a boolean, so it should be directly usable
+    message = renderer.render(message_type, link=info, info=info)
 
-    # Store the current message_ids for future deletion
-    session.bot_message_ids = session.bot_message_ids + message_ids
+    # Long schedules are split between days and queued back to back, so the parts keep their order
+    for chunk in chunker.split_message(message):
+        reply(chat_id, chunk, disable_web_page_preview=True, parse_mode='Markdown')
 
 async def schedule_now(update: Update, context: CallbackContext) -> None:
     """Reply info about the current lesson."""
     # Store the user's message ID for future deletion
-    session.user_message_ids.append(update.message.message_id)
+    sessions.get(update.effective_chat.id).user_message_ids.append(update.message.message_id)
 
     await send_schedule_message(update, context, MESSAGE_NOW)
 
 async def schedule_today(update: Update, context: CallbackContext) -> None:
     """Reply info about today's lessons."""
     # Store the user's message ID for future deletion
-    session.user_message_ids.append(update.message.message_id)
+    sessions.get(update.effective_chat.id).user_message_ids.append(update.message.message_id)
 
     await send_schedule_message(update, context, MESSAGE_TODAY)
 
 async def schedule_this_week(update: Update, context: CallbackContext) -> None:
     """Reply info about this week's lessons."""
     # Store the user's message ID for future deletion
-    session.user_message_ids.append(update.message.message_id)
+    sessions.get(update.effective_chat.id).user_message_ids.append(update.message.message_id)
 
     await send_schedule_message(update, context, MESSAGE_WEEK)
 
 async def schedule_all(update: Update, context: CallbackContext) -> None:
     """Reply info about all lessons."""
     # Store the user's message ID for future deletion
-    session.user_message_ids.append(update.message.message_id)
+    sessions.get(update.effective_chat.id).user_message_ids.append(update.message.message_id)
 
     await send_schedule_message(update, context, MESSAGE_ALL)
 
+async def inline_query(update: Update, context: CallbackContext) -> None:
+    """Answer an inline schedule lookup, e.g. "@bot today" or "@bot week 2"."""
+    # Anybody may query the bot inline, so users are limited in their private chat's buckets
+    user_id = update.inline_query.from_user.id
+    if not rate_limit(user_id, user_id):
+        await update.inline_query.answer([], cache_time=0, is_personal=True)
+        return
+
+    lookups = inline_results.parse_query(update.inline_query.query)
+    results = inline.get(lookups, fetch_schedule.get_schedule_version())
+
+    # Results are the same for everybody, Telegram may cache them until the first one changes
+    cache_time = config.INLINE_CACHE_TIME
+    for msg_type, _ in lookups:
+        expires_at = renderer.expiry(msg_type)
+        if expires_at is not None:
+            cache_time = min(cache_time, expires_at - time())
+    await update.inline_query.answer(results, cache_time=max(0, int(cache_time)), is_personal=False)
+
+def render_inline(msg_type: int, week: int) -> str:
+    """Render the message of an inline result, for the current week if week is None."""
+    # Only the week of the time details matters for a week message. Results are shared with
+    # everybody, approved chat or not, so lesson links stay out of them
+    time_details = (0, 0, week) if week else None
+    return renderer.render(msg_type, link=False, info=False, time_details=time_details)
+
 
 ###############
 #MAIN#FUNCTION#
@@ -657,11 +661,68 @@ async def schedule_all(update: Update, context: CallbackContext) -> None:
 
 def main():
     """Main function"""
+    # Parsed here, so importing this module (e.g. from benchmarks) leaves sys.argv alone
+    args = parser.parse_args()
+
+    logger.configure(config.LOG_FILE, json_lines=config.LOG_JSON, max_bytes=config.LOG_MAX_BYTES,
+                     backups=config.LOG_BACKUPS, when=config.LOG_ROTATE_WHEN,
+                     sampling=config.LOG_SAMPLING, level=config.LOG_LEVEL)
+
     if args.fill_none_values:
         config.fill_none_values()
         sys.exit()
 
-    app = Application.builder().token(config.AUTH_TOKEN).build()
+    # Serve the last saved schedule right away and scrape in the background,
+    # unless asked to wait for a fresh one
+    if args.blocking_scrape:
+        fetch_schedule.extract_and_save_schedule(config.URL, config.TABLE_IDS,
+                                                 config.LESSON_TYPES, config.HTML_PARSER)
+        startup_timer.mark("blocking scrape")
+
+    # Lesson alerts fire exactly before every lesson in the timetable
+    scheduler = LessonScheduler(config.TIMESTAMPS, config.WEEKDAYS, config.TIMEZONE,
+                                lead=config.ALERT_LEAD, callback=callback_send_message,
+                                prepare=prepare_alert, prepare_ahead=config.ALERT_PREPARE)
+
+    # Keep the schedule up to date while the bot runs, replanning alerts on changes
+    refresher = ScheduleRefresher(config.URL, config.TABLE_IDS, config.LESSON_TYPES,
+                                  interval=config.REFRESH_INTERVAL,
+                                  max_interval=config.REFRESH_MAX_INTERVAL,
+                                  parser=config.HTML_PARSER,
+                                  on_change=scheduler.plan)
+
+    # Prometheus endpoint, on localhost only
+    metrics_server = None
+    if config.METRICS_PORT:
+        metrics_server = HTTPServer(config.METRICS_HOST, config.METRICS_PORT,
+                                    {("GET", "/metrics"): metrics_endpoint})
+
+    async def post_init(app: Application) -> None:
+        sender.start(app.bot)
+        if metrics_server:
+            await metrics_server.start()
+        startup_timer.mark("bot initialization")
+        log("bot handler", startup_timer.report())
+
+    async def post_shutdown(app: Application) -> None:
+        await refresher.close()
+        await sender.close()
+        if metrics_server:
+            await metrics_server.close()
+        # Last, as the refresher may still be writing. Closing the last connection checkpoints the WAL
+        db.close()
+
+    app = (Application.builder().token(config.AUTH_TOKEN)
+           .request(InstrumentedRequest(connection_pool_size=config.CONNECTION_POOL_SIZE))
+           .concurrent_updates(config.CONCURRENT_UPDATES)
+           .post_init(post_init).post_shutdown(post_shutdown).build())
+    refresher.start(app.job_queue, first=config.REFRESH_INTERVAL if args.blocking_scrape else 0)
+    scheduler.start(app.job_queue)
+    app.job_queue.run_repeating(evict_sessions, interval=config.SESSION_IDLE, first=config.SESSION_IDLE)
+    app.job_queue.run_repeating(optimize_database, interval=config.DB_OPTIMIZE_INTERVAL,
+                                first=config.DB_OPTIMIZE_INTERVAL)
+    app.job_queue.run_repeating(delete_message, interval=config.AUTODELETE_SWEEP, first=config.AUTODELETE_SWEEP)
+    startup_timer.mark("application build")
 
     # Handlers
     handlers = [
@@ -678,13 +739,24 @@ def main():
         CommandHandler('commands', addcommands),
         CommandHandler("start", start),
         CommandHandler("autodelete",toggle_autodeletion),
+        CommandHandler("stats", stats),
+        ChatMemberHandler(track_chat_admins, ChatMemberHandler.ANY_CHAT_MEMBER),
+        InlineQueryHandler(inline_query),
         MessageHandler(filters.COMMAND, unknown)  # This must be the last handler
     ]
 
     for handler in handlers:
+        handler.callback = metrics.track_handler(handler.callback)
         app.add_handler(handler)
 
-    app.run_polling()
+    if args.webhook:
+        webhook = Webhook(app, config.WEBHOOK_HOST, config.WEBHOOK_PORT, config.WEBHOOK_PATH,
+                          url=config.WEBHOOK_URL, secret=config.WEBHOOK_SECRET,
+                          max_connections=config.WEBHOOK_MAX_CONNECTIONS)
+        asyncio.run(webhook.run())
+    else:
+        # Chat member updates are only delivered when asked for explicitly
+        app.run_polling(allowed_updates=Update.ALL_TYPES)
 
 if __name__ == "__main__":
     main()
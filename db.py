@@ -0,0 +1,152 @@
+"""Shared SQLite connection layer.
+
+Every module talks to the database through this one: reads go through a
+long-lived per-thread connection, writes through a single writer connection
+guarded by a lock. The database runs in WAL mode, so readers never wait for
+the writer and the writer never waits for readers. The schema is
+brought up to date by migrations.py before the first query.
+"""
+
+import sqlite3
+import threading
+from contextlib import contextmanager
+from time import perf_counter
+
+import migrations
+from metrics import registry
+
+
+DB_PATH = 'data/calenbot.db'
+
+# Applied to every connection right after it is opened
+PRAGMAS = (
+    ("journal_mode", "WAL"),
+    ("synchronous", "NORMAL"),  # Safe with WAL, fsync only on checkpoints
+    ("cache_size", -8000),  # In KiB, i.e. 8 MiB page cache per connection
+    ("mmap_size", 64 * 1024 * 1024),
+    ("temp_store", "MEMORY"),
+    ("busy_timeout", 5000),  # In milliseconds
+)
+STATEMENT_CACHE_SIZE = 256  # Prepared statements kept per connection
+
+_schema_ready = False  # Migrations are checked once per process
+_schema_lock = threading.Lock()
+
+_local = threading.local()  # Holds the read connection of each thread
+_readers = []  # All read connections, so close() can reach them
+_generation = 0  # Bumped by close(), so threads drop their stale read connections
+_writer = None
+_writer_lock = threading.RLock()
+
+
+def _connect():
+    """Open a new connection with the project-wide settings applied."""
+    conn = sqlite3.connect(DB_PATH, isolation_level=None, check_same_thread=False,
+                           cached_statements=STATEMENT_CACHE_SIZE)
+    for name, value in PRAGMAS:
+        conn.execute(f"PRAGMA {name} = {value}")
+    return conn
+
+def _ensure_schema(conn):
+    """Migrate the database once per process."""
+    global _schema_ready
+    if _schema_ready:
+        return
+    with _schema_lock:
+        if _schema_ready:
+            return
+        with _writer_lock:
+            migrations.migrate(conn)
+        _schema_ready = True
+
+def reader():
+    """
+    Returns the read connection of the current thread, opening it on first use.
+
+    The connection is in autocommit mode, so every query sees the latest
+    committed data.
+
+    Returns:
+        sqlite3.Connection: The read connection.
+    """
+    conn = getattr(_local, 'conn', None)
+    if conn is None or _local.generation != _generation:
+        conn = _connect()
+        _local.conn = conn
+        _local.generation = _generation
+        _readers.append(conn)
+    _ensure_schema(conn)
+    return conn
+
+def execute(sql, params=()):
+    """
+    Runs a read query on the current thread's read connection.
+
+    Parameters:
+        sql (str): The query.
+        params (tuple): Query parameters.
+
+    Returns:
+        sqlite3.Cursor: The cursor holding the results.
+    """
+    conn = reader()
+    started = perf_counter()
+    try:
+        return conn.execute(sql, params)
+    finally:
+        registry.observe("calenbot_db_seconds", perf_counter() - started, (("kind", "read"),))
+
+@contextmanager
+def transaction():
+    """
+    Runs the block inside a single write transaction on the writer connection.
+
+    Commits when the block exits normally and rolls back on any exception.
+
+    Yields:
+        sqlite3.Cursor: A cursor on the writer connection.
+    """
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = _connect()
+        _ensure_schema(_writer)
+
+        started = perf_counter()
+        cursor = _writer.cursor()
+        cursor.execute("BEGIN IMMEDIATE")
+        try:
+            yield cursor
+        except BaseException:
+            _writer.rollback()
+            raise
+        else:
+            _writer.commit()
+        finally:
+            cursor.close()
+            registry.observe("calenbot_db_seconds", perf_counter() - started, (("kind", "write"),))
+
+def optimize():
+    """
+    Lets SQLite refresh the query planner statistics that went stale.
+
+    Cheap when nothing changed, meant to run periodically and before closing.
+    """
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = _connect()
+        _ensure_schema(_writer)
+        _writer.execute("PRAGMA optimize")
+
+def close():
+    """Close all connections, they are reopened on next use."""
+    global _writer, _generation
+    with _writer_lock:
+        if _writer is not None:
+            _writer.execute("PRAGMA optimize")
+            _writer.close()
+            _writer = None
+        _generation += 1
+    while _readers:
+        _readers.pop().close()
@@ -1,6 +1,5 @@
 """Contains configs for telegram bot."""
 
-from datetime import datetime
 from collections import namedtuple
 import fetch_schedule
 
@@ -13,6 +12,8 @@ URL = ""
 
 # Bot in group settings
 MAX_REQUEST = 3 # Max repeated requests for one user in REQUEST_TIME
+CHAT_MAX_REQUEST = 10 # Max requests for one group in REQUEST_TIME
+GLOBAL_MAX_REQUEST = 600 # Max requests for the whole bot in REQUEST_TIME
 REQUEST_TIME = 1  # in minutes
 
 # Schedule settings
@@ -20,13 +21,30 @@ Text = namedtuple("Text", ['weekdays','timestamps','week','teacher',
                            'link','email','phone', 'no_lesson','no_day',
                            'scheduled_lesson', 'next_lesson','current_lesson','err',
                            'unknown_command','no_auth','verbose_mode','deaf_mode',
-                           'request_limit'])
+                           'request_limit','inline_titles'])
 
-INTERVAL = 115 * 60 # In minutes
-START = "8:25"
-END = "18:25"
-LESSON_LENGTH = 95 * 60 # In minutes
+LESSON_LENGTH = 95 * 60 # In seconds
 AUTODELETE = 3 * 60 # In minutes
+TIMEZONE = "Europe/Kyiv" # Timezone of TIMESTAMPS, lesson alerts are planned in it
+ALERT_LEAD = 5 * 60 # In seconds, how long before a lesson starts its alert is sent
+ALERT_PREPARE = 60 # In seconds, how long before an alert its message is rendered
+ALERT_CONCURRENCY = 64 # Max alerts being sent at the same time
+AUTODELETE_SWEEP = 30 # In seconds, how often expired messages are looked for
+AUTODELETE_CONCURRENCY = 8 # Max chats cleaned up at the same time
+MESSAGE_CACHE_SIZE = 64 # Max rendered messages kept in memory
+SESSION_IDLE = 60 * 60 # In seconds, chats quiet for this long are dropped from memory
+MAX_SESSIONS = 10000 # Max chat sessions kept in memory
+SEND_GLOBAL_RATE = 30 # Messages per second the bot sends in total
+SEND_GROUP_RATE = 20 # Messages per minute the bot sends to one group
+SEND_PRIVATE_RATE = 60 # Messages per minute the bot sends to one private chat
+SEND_BURST = 5 # Messages a chat may get at once before pacing starts
+SEND_MAX_RETRIES = 3 # Retries of a message after Telegram asks to slow down
+ADMIN_CACHE_TTL = 10 * 60 # In seconds, cached admin lists older than this are refreshed in the background
+INLINE_CACHE_TIME = 5 * 60 # In seconds, max time Telegram may serve cached inline results
+INLINE_CACHE_SIZE = 64 # Max inline result sets kept in memory
+DB_OPTIMIZE_INTERVAL = 24 * 60 * 60 # In seconds, how often SQLite refreshes its query planner statistics
+REFRESH_INTERVAL = 60 * 60 # In seconds, how often to check the schedule page for changes
+REFRESH_MAX_INTERVAL = 6 * 60 * 60 # In seconds, upper bound while the page stays the same
 WEEKDAYS = ['Понеділок', 'Вівторок', 'Середа', 'Четвер', "П'ятниця"]
 TIMESTAMPS = ["08:30", "10:25", "12:20", "14:15", "16:10", "18:05"]
 TEXT = Text(weekdays = WEEKDAYS,
@@ -47,98 +65,34 @@ TEXT = Text(weekdays = WEEKDAYS,
             request_limit = "Ліміт запросів перевищеноб будь ласка почекайте!",
             verbose_mode = ["Додаткова інфа до розладу:",'Викл.','Вкл.'],
             deaf_mode = ["Чи реагую на команди?",'Так!','Ні!'],
+            inline_titles = ["Зараз", "Сьогодні", "Тиждень"],
 )
 TABLE_IDS = ["ctl00_MainContent_SecondScheduleTable", "ctl00_MainContent_FirstScheduleTable"]
 LESSON_TYPES = ["Лек","Лаб","Прак"]
+METRICS_HOST = "127.0.0.1" # Address of the Prometheus metrics endpoint, keep it local
+METRICS_PORT = 9464 # Port of the Prometheus metrics endpoint, None disables it
+CONCURRENT_UPDATES = 16 # Updates processed at the same time
+CONNECTION_POOL_SIZE = 256 # Connections to the Bot API, handlers, alerts and the outbox share them
+WEBHOOK_HOST = "127.0.0.1" # Address the webhook server listens on, put it behind a TLS proxy
+WEBHOOK_PORT = 8080 # Port the webhook server listens on
+WEBHOOK_PATH = "/telegram" # Path Telegram posts updates to
+WEBHOOK_URL = None # Public https URL of WEBHOOK_PATH, registered on start; None leaves the webhook as it is
+WEBHOOK_SECRET = None # Token Telegram sends with every update, generated on start if None; required without WEBHOOK_URL
+WEBHOOK_MAX_CONNECTIONS = 40 # Connections Telegram may open to the webhook at once
+LOG_FILE = "./data/bot.log"
+LOG_LEVEL = "INFO" # "DEBUG" also logs every handled update with its latency
+LOG_JSON = False # Write JSON lines with structured fields instead of plain text
+LOG_MAX_BYTES = 5*1024*1024 # Size at which the log file is rotated
+LOG_BACKUPS = 5 # Rotated log files to keep
+LOG_ROTATE_WHEN = None # Rotate by time instead of size, e.g. "midnight"
+LOG_SAMPLING = {"httpx": 0.01} # Share of records below WARNING to keep per logger, httpx logs every request
+HTML_PARSER = None # "selectolax", "lxml" or "html.parser", None picks the fastest one installed
 
 # Helper functions (changing this functions is not recommended)
 
-fetch_schedule.extract_and_save_schedule(URL, TABLE_IDS, LESSON_TYPES)
-
-def get_current_time_details(start, end, interval, lesson_length):
-    """
-    Get details about the current time, day, and week.
-
-    Parameters:
-        start (str): The start time in HH:MM format.
-        end (str): The end time in HH:MM format.
-        interval (int): The interval between lessons in seconds.
-        lesson_length (int): The interval between lessons end and next lesson start in seconds.
-
-    Returns:
-        tuple: The current lesson index, day of the week, and week number (odd/even).
-    """
-    current_time = datetime.now().time()
-    current_day = datetime.now().weekday()
-    current_date = datetime.now().date()
-    current_week = 2 if current_date.isocalendar()[1] % 2 == 1 else 1
-
-    start_time = datetime.strptime(start, '%H:%M').time()
-    end_time = datetime.strptime(end, '%H:%M').time()
-
-    if start_time <= current_time <= end_time:
-        elapsed_time = datetime.combine(datetime.today(), current_time) - datetime.combine(datetime.today(), start_time)
-        total_seconds = elapsed_time.total_seconds()
-        lesson_index = int(total_seconds // (interval))
-
-    # Check if we are exactly at the end of a lesson
-        if total_seconds % (interval) == 0:
-            lesson_index += 1  # Move to the next lesson index
-
-    # Check if we are between lessons
-        elif total_seconds % (interval) <= (lesson_length):
-            lesson_index += 1  # Move to the next lesson index
-    else:
-        lesson_index = 100 # To make sure the lesson_index is out of range
-
-    return lesson_index, current_day, current_week
-
-def form_message(msg_type, text=TEXT, link=True, info=False, return_false=False, callback_message=False):
-    """
-    Generate a message based on the type specified.
-
-    Parameters:
-        msg_type (str): Type of message to generate.
-        text (object): Text object containing various text templates.
-        link (bool): Whether to include links in the message.
-        info (bool): Whether to include additional information.
-        return_false (bool): Whether to return False if date out of schedule range.
-        callback_message (bool): Changes the text of the message for MESSAGE_NOW
-
-    Returns:
-        str: The generated message.
-    """
-    MESSAGE_NOW = 0
-    MESSAGE_TODAY = 1
-    MESSAGE_WEEK = 2
-    MESSAGE_ALL = 3
-
-    form_sch = fetch_schedule.form_schedule
-    reply_text = ""
-    l, d, w = get_current_time_details(START, END, INTERVAL,LESSON_LENGTH)
-
-    if msg_type == MESSAGE_NOW:
-        lesson = form_sch(text, lesson_index=l, day_index=d, week=w, include_teacher_info=info, include_links=link)
-        next_lesson = form_sch(text, lesson_index=(l+1), day_index=d, week=w, include_teacher_info=info, include_links=link)
-        current_lesson_text = text.scheduled_lesson if callback_message else text.current_lesson
-        reply_text += current_lesson_text if lesson else text.no_lesson
-        reply_text += lesson
-        reply_text += text.next_scheduled_lesson + next_lesson if next_lesson else ""
-        if return_false and reply_text == text.no_lesson:
-            return False
-    elif msg_type == MESSAGE_TODAY:
-        day = form_sch(text, day_index=d, week=w, include_teacher_info=info, include_links=link)
-        reply_text += day if day else text.no_day
-    elif msg_type == MESSAGE_WEEK:
-        week = form_sch(text, week=w, include_teacher_info=info, include_links=link)
-        reply_text += week if week else text.err
-    elif msg_type == MESSAGE_ALL:
-        week_1 = form_sch(text, week=1, include_teacher_info=info, include_links=link)
-        week_2 = form_sch(text, week=2, include_teacher_info=info, include_links=link)
-        all = week_1 + "%%" + week_2
-        reply_text += all if all else text.err
-
-    return reply_text
+# The schedule is scraped by core.py in the background once the bot is up,
+# don't call fetch_schedule.extract_and_save_schedule here or startup will wait for it
+# Schedule messages are formed by messages.py
 
 def fill_none_values():
     fetch_schedule.check_none_values('teachers')
@@ -1,11 +1,10 @@
-import requests
-from bs4 import BeautifulSoup
-import sqlite3
+import hashlib
 from collections import OrderedDict
 from logger import log_action as log
+import db
+import schedule_parser
 
 
-DB_PATH = 'data/calenbot.db'
 # Constants for table indices
 ID_INDEX = 0
 SUBJECT_INDEX = 1
@@ -17,41 +16,12 @@ TIMESTAMP_INDEX = 1
 WEEKDAY_INDEX = 2
 WEEK_NUMBER_INDEX = 4
 
+# Compiled schedule index, built on first use and dropped on every write
+_schedule_index = None
+# Bumped on every write, so caches built on top of the schedule can expire
+_schedule_version = 0
 
-conn = sqlite3.connect(DB_PATH)
-cursor = conn.cursor()
-
-cursor.execute('''
-    CREATE TABLE IF NOT EXISTS lessons (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    subject TEXT,
-    type TEXT,
-    link TEXT,
-    teacher_id TEXT,
-    FOREIGN KEY (teacher_id) REFERENCES teachers (id),
-    UNIQUE(subject, type, teacher_id)
-);''')
-
-cursor.execute('''
-CREATE TABLE IF NOT EXISTS teachers (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    name TEXT UNIQUE,
-    email TEXT,
-    phone TEXT
-);''')
-
-cursor.execute('''
-CREATE TABLE IF NOT EXISTS schedule (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    timestamp TEXT,
-    weekday TEXT,
-    lesson_id INTEGER,
-    week_number INTEGER,
-    FOREIGN KEY (lesson_id) REFERENCES lessons(id),
-    UNIQUE(timestamp, weekday, lesson_id, week_number)
-);''')
-
-conn.close()
+# The tables are created and migrated by migrations.py
 
 
 def check_none_values(table_name):
@@ -64,12 +34,8 @@ def check_none_values(table_name):
     Returns:
         None
     """
-    # Initialize SQLite connection
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-
     # Fetch all rows from the table
-    cursor.execute(f"SELECT * FROM {table_name}")
+    cursor = db.execute(f"SELECT * FROM {table_name}")
     rows = cursor.fetchall()
     description = cursor.description
 
@@ -113,19 +79,15 @@ def check_none_values(table_name):
             if not new_value or new_value.strip() == "":
                 continue
 
-            for row_id in row_ids:
-                cursor.execute(
+            # Update all rows in one transaction
+            with db.transaction() as cursor:
+                cursor.executemany(
                     f"UPDATE {table_name} SET {column_name} = ? WHERE id = ?",
-                    (new_value, row_id)
+                    [(new_value, row_id) for row_id in row_ids]
                 )
+            invalidate_schedule_index()
 
-            # Commit changes to the database
-            conn.commit()
-
-    # Close the SQLite connection
-    conn.close()
-
-def extract_and_save_schedule(url, table_ids, lesson_types):
+def extract_and_save_schedule(url, table_ids, lesson_types, parser=None):
     """
     Extracts schedule information from a URL and saves it to an SQLite database.
 
@@ -133,91 +95,133 @@ def extract_and_save_schedule(url, table_ids, lesson_types):
         url (str): The URL to scrape.
         table_ids (list): List of table IDs to look for in the HTML.
         lesson_types (list): List of lesson types to consider.
+        parser (str, optional): HTML parser backend, see schedule_parser.get_backend.
 
     Returns:
         None
     """
+    import requests  # Imported lazily, only the blocking scrape needs it
+
     try:
         response = requests.get(url, timeout=5)
     except requests.exceptions.Timeout:
         log("Schedule Handler","Connection error, couldn't update the schedule")
         return
 
-    html = response.text
-    soup = BeautifulSoup(html, 'html.parser')
-
-    # Initialize SQLite connection
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
+    save_schedule(response.text, table_ids, lesson_types, parser)
 
-    # Iterate through each table ID
-    for table_id in table_ids:
-        table = soup.find('table', {'id': table_id})
-        rows = table.find_all('tr')
-        header = [td.text.strip() for td in rows[0].find_all('td')][1:]
-        week_number = 1 if "First" in table_id else 2
+def _fingerprint(value):
+    """Stable content hash of parsed schedule data."""
+    return hashlib.sha256(repr(value).encode()).hexdigest()
 
-        # Iterate through each row in the table
-        for row in rows[1:]:
-            row_data = [td for td in row.find_all('td')]
-            timestamp = row_data[0].text.strip()[1:]
-            weekdays_data = row_data[1:]
-
-            # Iterate through each weekday
-            for i, day in enumerate(header):
-                cell_content = weekdays_data[i]
-
-                # Skip empty cells
-                if not cell_content.text.strip():
-                    continue
+def save_schedule(html, table_ids, lesson_types, parser=None):
+    """
+    Parses schedule tables from an HTML page and saves them to an SQLite database.
 
-                # Extract and validate subject
-                subject_span = cell_content.find('span', {'class': 'disLabel'})
-                if subject_span:
-                    subject = subject_span.text.strip()
-                else:
-                    continue  # Skip if subject is not found
+    Each table and each cell is fingerprinted and compared with the snapshot
+    of the last saved page, so only changed cells are written: new cells are
+    inserted, changed ones updated and vanished ones deleted. Everything is
+    written in a single transaction, so the database is never left half-updated.
 
-                # Extract teacher names
-                teacher_elements = [a for a in cell_content.find_all('a', {'class': 'plainLink'}) if not a.find_parent('span')]
-                teacher_names = [elem.text.strip() for elem in teacher_elements if all(word not in elem.text for word in lesson_types)]
+    Parameters:
+        html (str): The page content.
+        table_ids (list): List of table IDs to look for in the HTML.
+        lesson_types (list): List of lesson types to consider.
+        parser (str, optional): HTML parser backend, see schedule_parser.get_backend.
 
-                # Extract and validate type of lesson
-                type_element = cell_content.find('a', string=lambda x: any(word in x for word in lesson_types))
-                if type_element:
-                    type_of_lesson = next((keyword for keyword in lesson_types if keyword in type_element.text), None)
-                else:
-                    type_of_lesson = next((keyword for keyword in lesson_types if keyword in cell_content.text), None)
-
-                # Insert or update teacher information
-                teacher_ids = []
-                for teacher_name in teacher_names:
-                    cursor.execute("INSERT OR IGNORE INTO teachers (name) VALUES (?)", (teacher_name,))
-                    cursor.execute("SELECT id FROM teachers WHERE name = ?", (teacher_name,))
-                    teacher_ids.append(cursor.fetchone()[ID_INDEX])
-
-                # Insert or ignore lesson information
-                cursor.execute("""
-                    INSERT OR IGNORE INTO lessons (subject, type, link, teacher_id)
-                    VALUES (?, ?, ?, ?)
-                """, (subject, type_of_lesson, None, ','.join(map(str, teacher_ids))))
-
-                # Retrieve the lesson ID
-                cursor.execute("SELECT id FROM lessons WHERE subject = ? AND type = ? AND teacher_id = ?",
-                               (subject, type_of_lesson, ','.join(map(str, teacher_ids))))
-                lesson_id = cursor.fetchone()[ID_INDEX]
-
-                # Insert or ignore schedule information
-                cursor.execute("""
-                    INSERT OR IGNORE INTO schedule (timestamp, weekday, lesson_id, week_number)
-                    VALUES (?, ?, ?, ?)
-                """, (timestamp, day, lesson_id, week_number))
-
-        # Commit changes to the database
-        conn.commit()
-
-    # Close SQLite connection
-    conn.close()
+    Returns:
+        bool: True if anything was written.
+    """
+    batch = schedule_parser.parse_schedule(html, table_ids, lesson_types, backend=parser)
+
+    # Group cells by table, i.e. by week number. Every table is there even if it's empty, so
+    # a table whose lessons are all gone still diffs against its snapshot and gets cleared
+    tables = OrderedDict((schedule_parser.table_week_number(table_id), OrderedDict()) for table_id in table_ids)
+    for week_number, day, timestamp, *lesson in batch:
+        tables.setdefault(week_number, OrderedDict())[(day, timestamp)] = tuple(lesson)
+
+    # Unchanged tables cost one hash comparison
+    stored = dict(db.execute("SELECT week_number, fingerprint FROM schedule_snapshot").fetchall())
+    fingerprints = {week_number: _fingerprint(list(cells.items())) for week_number, cells in tables.items()}
+    changed_tables = [week_number for week_number in tables
+                      if stored.get(week_number) != fingerprints[week_number]]
+    if not changed_tables:
+        return False
+
+    # Diff cells of changed tables against the snapshot
+    upserts = []  # (week_number, day, timestamp, lesson, fingerprint, is_new)
+    deletes = []  # (week_number, day, timestamp)
+    for week_number in changed_tables:
+        cells = tables[week_number]
+        stored_cells = {(day, timestamp): fingerprint for day, timestamp, fingerprint in db.execute(
+            "SELECT weekday, timestamp, fingerprint FROM schedule_cells WHERE week_number = ?",
+            (week_number,)).fetchall()}
+        for (day, timestamp), lesson in cells.items():
+            fingerprint = _fingerprint(lesson)
+            if stored_cells.get((day, timestamp)) != fingerprint:
+                upserts.append((week_number, day, timestamp, lesson, fingerprint,
+                                (day, timestamp) not in stored_cells))
+        deletes += [(week_number, day, timestamp) for day, timestamp in stored_cells
+                    if (day, timestamp) not in cells]
+
+    with db.transaction() as cursor:
+        # A table without a snapshot comes from before diffing existed, rebuild it from scratch
+        for week_number in changed_tables:
+            if week_number not in stored:
+                cursor.execute("DELETE FROM schedule WHERE week_number = ?", (week_number,))
+
+        # Insert new teachers in order of appearance, then resolve all ids with one query
+        teacher_names = dict.fromkeys(name for *_, lesson, _, _ in upserts for name in lesson[2])
+        cursor.execute("SELECT name, id FROM teachers")
+        teacher_map = dict(cursor.fetchall())
+        cursor.executemany("INSERT OR IGNORE INTO teachers (name) VALUES (?)",
+                           [(name,) for name in teacher_names if name not in teacher_map])
+        cursor.execute("SELECT name, id FROM teachers")
+        teacher_map = dict(cursor.fetchall())
+
+        # Lessons are identified by subject, type and the joined teacher ids
+        lesson_keys = [(subject, type_of_lesson, ','.join(str(teacher_map[name]) for name in names))
+                       for *_, (subject, type_of_lesson, names), _, _ in upserts]
+
+        # Insert new lessons (NULL types would slip past UNIQUE, so check the map), then resolve ids
+        cursor.execute("SELECT subject, type, teacher_id, id FROM lessons")
+        lesson_map = {tuple(row[:3]): row[3] for row in cursor.fetchall()}
+        cursor.executemany("""
+            INSERT OR IGNORE INTO lessons (subject, type, link, teacher_id)
+            VALUES (?, ?, NULL, ?)
+        """, [key for key in dict.fromkeys(lesson_keys) if key not in lesson_map])
+        cursor.execute("SELECT subject, type, teacher_id, id FROM lessons")
+        lesson_map = {tuple(row[:3]): row[3] for row in cursor.fetchall()}
+
+        # Teachers of every lesson in page order, existing lessons already have theirs
+        cursor.executemany("""
+            INSERT OR IGNORE INTO lesson_teachers (lesson_id, position, teacher_id)
+            VALUES (?, ?, ?)
+        """, [(lesson_map[key], position, teacher_map[name])
+              for key, (*_, (_, _, names), _, _) in dict(zip(lesson_keys, upserts)).items()
+              for position, name in enumerate(names)])
+
+        # Apply the diff to the schedule, changed cells are deleted and inserted again
+        cursor.executemany("DELETE FROM schedule WHERE week_number = ? AND weekday = ? AND timestamp = ?",
+                           deletes + [(week_number, day, timestamp)
+                                      for week_number, day, timestamp, _, _, is_new in upserts if not is_new])
+        cursor.executemany("""
+            INSERT OR IGNORE INTO schedule (timestamp, weekday, lesson_id, week_number)
+            VALUES (?, ?, ?, ?)
+        """, [(timestamp, day, lesson_map[key], week_number)
+              for (week_number, day, timestamp, *_), key in zip(upserts, lesson_keys)])
+
+        # Store the new snapshot
+        cursor.executemany("DELETE FROM schedule_cells WHERE week_number = ? AND weekday = ? AND timestamp = ?",
+                           deletes)
+        cursor.executemany("INSERT OR REPLACE INTO schedule_cells VALUES (?, ?, ?, ?)",
+                           [(week_number, day, timestamp, fingerprint)
+                            for week_number, day, timestamp, _, fingerprint, _ in upserts])
+        cursor.executemany("INSERT OR REPLACE INTO schedule_snapshot VALUES (?, ?)",
+                           [(week_number, fingerprints[week_number]) for week_number in changed_tables])
+
+    invalidate_schedule_index()
+    return True
 
 def fetch_data_as_dict(table_name, key_index=ID_INDEX):
     """
@@ -231,12 +235,9 @@ def fetch_data_as_dict(table_name, key_index=ID_INDEX):
         dict: The fetched data in dictionary form.
     """
     data_dict = {}
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute(f"SELECT * FROM {table_name}")
+    cursor = db.execute(f"SELECT * FROM {table_name}")
     rows = cursor.fetchall()
     description = cursor.description  # This will contain column names
-    conn.close()
 
     column_names = [column[0] for column in description]
 
@@ -278,11 +279,208 @@ def fetch_schedule_as_dict(days_order):
 
     return schedule_dict
 
+def invalidate_schedule_index():
+    """
+    Drops the compiled schedule index, so it is rebuilt on the next lookup.
+    Must be called after every write to the schedule, lessons or teachers tables,
+    it is safe to call from a worker thread while the index is being built.
+
+    Returns:
+        None
+    """
+    global _schedule_index, _schedule_version
+    _schedule_index = None
+    _schedule_version += 1
+
+def get_schedule_version():
+    """
+    Returns the current version of the schedule data.
+
+    Returns:
+        int: A counter that changes every time the schedule data is written.
+    """
+    return _schedule_version
+
+def _resolve_lesson(lesson_data, teachers):
+    """
+    Resolves a lesson row and its teachers into a single record.
+
+    Parameters:
+        lesson_data (dict): The lesson row, empty if the lesson is missing.
+        teachers (list): Teacher rows of the lesson in page order.
+
+    Returns:
+        dict: The lesson record with a list of teacher rows under 'teachers'.
+    """
+    return {
+        'subject': lesson_data.get('subject', 'N/A'),
+        'type': lesson_data.get('type', 'N/A'),
+        'link': lesson_data.get('link', 'N/A'),
+        'teachers': teachers,
+    }
+
+def _timestamp_key(timestamp):
+    """Sort key for HH:MM timestamps, unparsable ones go last in text order."""
+    try:
+        hours, minutes = timestamp.split(":")
+        return (0, int(hours), int(minutes), "")
+    except (AttributeError, ValueError):
+        return (1, 0, 0, str(timestamp))
+
+def get_schedule_index(days_order):
+    """
+    Returns the compiled schedule index, building it from the database if needed.
+
+    The index holds resolved lesson and teacher records, so lookups never touch
+    SQLite until the next write invalidates it.
+
+    Parameters:
+        days_order (list): The desired order of weekdays.
+
+    Returns:
+        dict: 'weeks' maps week number -> weekday -> timestamp -> lesson record
+        in display order, 'slots' maps (week, weekday, timestamp) -> lesson record.
+    """
+    global _schedule_index
+    index = _schedule_index
+    if (index is not None and index['version'] == _schedule_version
+            and index['days_order'] == list(days_order)):
+        return index
+
+    # A save in a worker thread may change the data while it's read, so the index is tagged
+    # with the version from before reading and a newer write makes it stale right away
+    version = _schedule_version
+    schedule_dict = fetch_schedule_as_dict(days_order)
+    lessons_dict = fetch_data_as_dict('lessons')
+    teachers_dict = fetch_data_as_dict('teachers')
+    lesson_teachers = {}
+    for lesson_id, teacher_id in db.execute(
+            "SELECT lesson_id, teacher_id FROM lesson_teachers ORDER BY lesson_id, position").fetchall():
+        lesson_teachers.setdefault(lesson_id, []).append(teachers_dict.get(teacher_id, {}))
+
+    resolved = {}
+    weeks = OrderedDict()
+    slots = {}
+    for week_number, week_data in schedule_dict.items():
+        weeks[week_number] = OrderedDict()
+        for weekday, day_data in week_data.items():
+            weeks[week_number][weekday] = OrderedDict()
+            # Cells rewritten by a sync get new row ids, so order lessons by time instead
+            for timestamp, lesson_id in sorted(day_data.items(), key=lambda item: _timestamp_key(item[0])):
+                if lesson_id not in resolved:
+                    resolved[lesson_id] = _resolve_lesson(lessons_dict.get(lesson_id, {}),
+                                                          lesson_teachers.get(lesson_id, []))
+                weeks[week_number][weekday][timestamp] = resolved[lesson_id]
+                slots[(week_number, weekday, timestamp)] = resolved[lesson_id]
+
+    # Compiled Markdown views are added by _get_views
+    index = {'days_order': list(days_order), 'version': version, 'weeks': weeks, 'slots': slots, 'views': {}}
+    _schedule_index = index
+    return index
+
+def get_lesson(days_order, week, weekday, timestamp):
+    """
+    Looks up a single lesson in the compiled schedule index.
+
+    Parameters:
+        days_order (list): The desired order of weekdays.
+        week (int): The week number.
+        weekday (str): The weekday name.
+        timestamp (str): The lesson start time in HH:MM format.
+
+    Returns:
+        dict or None: The resolved lesson record, None if the slot is empty.
+    """
+    return get_schedule_index(days_order)['slots'].get((week, weekday, timestamp))
+
+_MARKDOWN_ESCAPES = str.maketrans({char: "\\" + char for char in "_*`["})
+
+def escape_markdown(value):
+    """Escapes the characters Telegram Markdown would read as entities in plain text."""
+    return str(value).translate(_MARKDOWN_ESCAPES)
+
+def _code(value):
+    """Text for inside a `code` span, where nothing can be escaped."""
+    return str(value).replace("`", "'")
+
+def _compile_teacher(teacher_data, text, include_teacher_info):
+    """Compiles the Markdown lines of a teacher."""
+    fragment = f"\t\t\t-\t{text.teacher}: {escape_markdown(teacher_data.get('name', 'N/A'))}"
+    if include_teacher_info:
+        teacher_email = teacher_data.get('email', 'N/A')
+        teacher_phone = teacher_data.get('phone', 'N/A')
+        if teacher_email:
+            fragment += f",\n\t{text.email}: {escape_markdown(teacher_email)}"
+        if teacher_phone:
+            fragment += f",\n\t{text.phone}: {escape_markdown(teacher_phone)}"
+    return fragment + "\n"
+
+def _compile_views(index, text, include_teacher_info, include_links):
+    """
+    Compiles the Markdown of every day and week in the schedule index.
+
+    Every lesson and teacher is formatted and escaped once, days and weeks
+    are then joined from these fragments.
+
+    Parameters:
+        index (dict): The compiled schedule index.
+        text (object): An object containing text templates.
+        include_teacher_info (bool): Whether to include teacher contact information.
+        include_links (bool): Whether to include lesson links.
+
+    Returns:
+        dict: 'days' maps (week, weekday) -> (header, [(timestamp, line)], block)
+        in display order, 'weeks' maps week number -> block.
+    """
+    teachers = {}  # Teacher id -> fragment
+    lessons = {}  # id() of a lesson record -> fragment, records are shared between slots
+
+    def lesson_fragment(lesson_data):
+        fragment = lessons.get(id(lesson_data))
+        if fragment is None:
+            fragment = f"`{_code(lesson_data['subject'])} ({_code(lesson_data['type'])})`\n"
+            if include_links and lesson_data['link']:
+                fragment += f"\t\t\t-\t*{text.link}:* {escape_markdown(lesson_data['link'])}\n"
+            for teacher_data in lesson_data['teachers']:
+                teacher_id = teacher_data.get('id')
+                if teacher_id not in teachers:
+                    teachers[teacher_id] = _compile_teacher(teacher_data, text, include_teacher_info)
+                fragment += teachers[teacher_id]
+            lessons[id(lesson_data)] = fragment
+        return fragment
+
+    days = OrderedDict()
+    weeks = OrderedDict()
+    for week_number, week_data in index['weeks'].items():
+        blocks = []
+        for weekday, day_data in week_data.items():
+            header = f"*{weekday} ({text.week} {week_number}):*\n"
+            lines = [(timestamp, f"\t*{timestamp}:* {lesson_fragment(lesson_data)}")
+                     for timestamp, lesson_data in day_data.items()]
+            block = header + "".join(line for _, line in lines) + "\n"
+            days[(week_number, weekday)] = (header, lines, block)
+            blocks.append(block)
+        weeks[week_number] = "".join(blocks)
+
+    return {'days': days, 'weeks': weeks}
+
+def _get_views(text, include_teacher_info, include_links):
+    """Returns the compiled views for a set of options, compiling them on first use."""
+    index = get_schedule_index(text.weekdays)
+    key = (include_teacher_info, bool(include_links), text.week, text.teacher, text.email, text.phone, text.link)
+    views = index['views'].get(key)
+    if views is None:
+        views = index['views'][key] = _compile_views(index, text, include_teacher_info, include_links)
+    return views
+
 def form_schedule(text, week=None, day_index=None, lesson_index=None,
                   include_teacher_info=False, include_links=True):
     """
     Formats the schedule data as a string, optionally filtering by week, day, and lesson index.
 
+    The output is joined from fragments compiled once per schedule version,
+    see _compile_views.
+
     Parameters:
         text (object): An object containing text templates and other contextual information.
         week (int, optional): The week number to filter by.
@@ -294,70 +492,43 @@ def form_schedule(text, week=None, day_index=None, lesson_index=None,
     Returns:
         str: The formatted schedule data.
     """
-    schedule_dict = fetch_schedule_as_dict(text.weekdays)
-    lessons_dict = fetch_data_as_dict('lessons')
-    teachers_dict = fetch_data_as_dict('teachers')
-
-    output = ""
+    views = _get_views(text, include_teacher_info, include_links)
     weekday_list = text.weekdays
     timestamp_list = text.timestamps
 
-    for week_number, week_data in schedule_dict.items():
+    # Whole weeks are compiled already
+    if day_index is None and lesson_index is None:
+        if week is not None:
+            return views['weeks'].get(week, "")
+        return "".join(views['weeks'].values())
+
+    output = []
+    for (week_number, weekday), (header, lines, block) in views['days'].items():
         if week is not None and week_number != week:
             continue
 
-        for weekday, day_data in week_data.items():
-            if day_index is not None:
-                if day_index in range(5):
-                    if weekday != weekday_list[day_index]:
-                        continue
-                else:
-                    return ""
+        if day_index is not None:
+            if day_index in range(5):
+                if weekday != weekday_list[day_index]:
+                    continue
+            else:
+                return ""
 
-            if lesson_index is not None and lesson_index >= len(day_data):
+        if lesson_index is None:
+            output.append(block)
+            continue
+
+        if lesson_index >= len(lines):
+            return ""
+
+        output.append(header)
+        for timestamp, line in lines:
+            if lesson_index in range(6):
+                if timestamp != timestamp_list[lesson_index]:
+                    continue
+            else:
                 return ""
+            output.append(line)
+        output.append("\n")
 
-            output += f"*{weekday} ({text.week} {week_number}):*\n"
-
-            for timestamp, lesson_id in day_data.items():
-                if lesson_index is not None:
-                    if lesson_index in range(6):
-                        if timestamp != timestamp_list[lesson_index]:
-                            continue
-                    else:
-                        return ""
-
-                lesson_data = lessons_dict.get(lesson_id, {})
-                subject = lesson_data.get('subject', 'N/A')
-                lesson_type = lesson_data.get('type', 'N/A')
-                lesson_link = lesson_data.get('link', 'N/A')
-
-                teacher_ids_str = lesson_data.get('teacher_id', '')
-                try:
-                    teacher_ids = teacher_ids_str.split(",") if teacher_ids_str else []
-                except AttributeError:
-                    teacher_ids = [teacher_ids_str]
-
-                teacher_details = []
-                for teacher_id in teacher_ids:
-                    teacher_data = teachers_dict.get(int(teacher_id), {})
-                    teacher_name = teacher_data.get('name', 'N/A')
-                    teacher_email = teacher_data.get('email', 'N/A')
-                    teacher_phone = teacher_data.get('phone', 'N/A')
-                    string = f"{text.teacher}: {teacher_name}"
-                    if include_teacher_info:
-                        if teacher_email:
-                            string += f",\n\t{text.email}: {teacher_email}"
-                        if teacher_phone:
-                            string += f",\n\t{text.phone}: {teacher_phone}"
-                    teacher_details.append(string)
-
-                output += f"\t*{timestamp}:* `{subject} ({lesson_type})`\n"
-                if include_links and lesson_link:
-                    output += f"\t\t\t-\t*{text.link}:* {lesson_link}\n"
-                for detail in teacher_details:
-                    output += f"\t\t\t-\t{detail}\n"
-
-            output += "\n"
-
-    return output if output else ""
+    return "".join(output)
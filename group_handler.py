@@ -1,23 +1,19 @@
 
 import sqlite3
 from logger import log_action as log
+import db
 
-# Constant for the database path
-DB_PATH = 'data/calenbot.db'
+# In-memory set of approved group names, loaded on first use and
+# kept in sync by add_group/remove_group
+_approved_groups = None
 
-# Initialize SQLite database and tables
-conn = sqlite3.connect(DB_PATH)
-cursor = conn.cursor()
-
-cursor.execute('''
-CREATE TABLE IF NOT EXISTS approved_groups (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    group_name TEXT UNIQUE,
-    group_data TEXT
-);
-''')
-
-conn.commit()
+def _load_approved_groups():
+    """Load the approved group names from the database, once per process."""
+    global _approved_groups
+    if _approved_groups is None:
+        rows = db.execute("SELECT group_name FROM approved_groups").fetchall()
+        _approved_groups = {group_name for group_name, in rows}
+    return _approved_groups
 
 def add_group(group_name, group_data=None):
     """
@@ -27,19 +23,16 @@ def add_group(group_name, group_data=None):
         group_name (str): The name of the group.
         group_data (str, optional): Additional data related to the group.
     """
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-
     try:
-        cursor.execute("INSERT INTO approved_groups (group_name, group_data) VALUES (?, ?)", (group_name, group_data))
-        conn.commit()
+        with db.transaction() as cursor:
+            cursor.execute("INSERT INTO approved_groups (group_name, group_data) VALUES (?, ?)", (group_name, group_data))
+        # Write-through, the set only changes once the row is committed
+        _load_approved_groups().add(str(group_name))
         # Replace log with your actual logging function
         log("group handler", f"Added group {group_name} to approved_groups.")
     except sqlite3.IntegrityError:
         log("group handler", "Group with this name already exists in approved_groups. No changes made.")
 
-    conn.close()
-
 def remove_group(group_name):
     """
     Remove a group from the approved_groups table.
@@ -47,23 +40,17 @@ def remove_group(group_name):
     Parameters:
         group_name (str): The name of the group to be removed.
     """
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-
-    # Check if the group exists
-    cursor.execute("SELECT COUNT(*) FROM approved_groups WHERE group_name = ?", (group_name,))
-    group_exists = cursor.fetchone()[0] > 0
+    with db.transaction() as cursor:
+        cursor.execute("DELETE FROM approved_groups WHERE group_name = ?", (group_name,))
+        group_exists = cursor.rowcount > 0
+    _load_approved_groups().discard(str(group_name))
 
     if group_exists:
-        cursor.execute("DELETE FROM approved_groups WHERE group_name = ?", (group_name,))
-        conn.commit()
         # Replace log with your actual logging function
         log("group_handler", f"Removed group {group_name} from approved_groups.")
     else:
         log("group_handler", f"Group {group_name} does not exist in approved_groups. No changes made.")
 
-    conn.close()
-
 def get_groups_as_dict():
     """
     Fetch all approved groups as a dictionary.
@@ -71,13 +58,44 @@ def get_groups_as_dict():
     Returns:
         dict: A dictionary with group names as keys and group data as values.
     """
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
+    rows = db.execute("SELECT group_name, group_data FROM approved_groups").fetchall()
 
-    cursor.execute("SELECT group_name, group_data FROM approved_groups")
-    rows = cursor.fetchall()
+    return {group_name: group_data for group_name, group_data in rows}
 
-    conn.close()
+def is_approved(group_name):
+    """
+    Check whether a group is in approved_groups without touching the database.
 
-    return {group_name: group_data for group_name, group_data in rows}
+    Parameters:
+        group_name (str): The name of the group.
 
+    Returns:
+        bool: True if the group is approved.
+    """
+    return str(group_name) in _load_approved_groups()
+
+def get_group_data(group_name):
+    """
+    Fetch the data stored for an approved group.
+
+    Parameters:
+        group_name (str): The name of the group.
+
+    Returns:
+        str or None: The group data, None if there is none or the group is not approved.
+    """
+    row = db.execute("SELECT group_data FROM approved_groups WHERE group_name = ?",
+                     (str(group_name),)).fetchone()
+    return row[0] if row else None
+
+def set_group_data(group_name, group_data):
+    """
+    Replace the data stored for an approved group, does nothing for other groups.
+
+    Parameters:
+        group_name (str): The name of the group.
+        group_data (str): The new group data.
+    """
+    with db.transaction() as cursor:
+        cursor.execute("UPDATE approved_groups SET group_data = ? WHERE group_name = ?",
+                       (group_data, str(group_name)))
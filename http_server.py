@@ -0,0 +1,117 @@
+"""Minimal asyncio HTTP/1.1 server for the bot's own endpoints.
+
+It runs on the bot's event loop, so handlers can use the bot's state
+directly, and needs nothing beyond the standard library. Routes map a
+method and a path to a coroutine that gets a Request and returns
+(status, content type, body). Connections are kept alive between
+requests, bodies need a Content-Length and are size-limited.
+"""
+
+import asyncio
+from http import HTTPStatus
+from urllib.parse import urlsplit
+
+from logger import log_action as log
+
+
+class Request:
+    __slots__ = ("method", "path", "query", "headers", "body")
+
+    def __init__(self, method, path, query, headers, body):
+        self.method = method
+        self.path = path
+        self.query = query
+        self.headers = headers  # Lower-cased names
+        self.body = body
+
+
+class HTTPServer:
+    def __init__(self, host, port, routes, max_body=1024 * 1024, timeout=30):
+        """
+        Parameters:
+            host (str): Address to listen on.
+            port (int): Port to listen on.
+            routes (dict): (method, path) -> coroutine function taking a Request.
+            max_body (int): Largest accepted request body in bytes.
+            timeout (float): Seconds to wait for a request on an open connection.
+        """
+        self.host = host
+        self.port = port
+        self.routes = routes
+        self.max_body = max_body
+        self.timeout = timeout
+        self.server = None
+
+    async def start(self):
+        self.server = await asyncio.start_server(self._serve, self.host, self.port)
+        log("http server", f"Listening on {self.host}:{self.port}")
+
+    async def close(self):
+        if self.server:
+            self.server.close()
+            await self.server.wait_closed()
+            self.server = None
+
+    async def _read_request(self, reader):
+        """Read one request, None if the client closed the connection."""
+        request_line = await reader.readline()
+        if not request_line:
+            return None
+        method, target, _ = request_line.decode("latin-1").split(" ", 2)
+
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        length = int(headers.get("content-length", 0))
+        if length > self.max_body:
+            raise ValueError("Request body too large")
+        body = await reader.readexactly(length) if length else b""
+
+        url = urlsplit(target)
+        return Request(method.upper(), url.path, url.query, headers, body)
+
+    @staticmethod
+    def _write_response(writer, status, content_type, body, keep_alive):
+        if isinstance(body, str):
+            body = body.encode()
+        status = HTTPStatus(status)
+        writer.write((f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+                      f"Content-Type: {content_type}\r\n"
+                      f"Content-Length: {len(body)}\r\n"
+                      f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n").encode() + body)
+
+    async def _serve(self, reader, writer):
+        try:
+            while True:
+                try:
+                    request = await asyncio.wait_for(self._read_request(reader), self.timeout)
+                except (ValueError, asyncio.IncompleteReadError):
+                    self._write_response(writer, 400, "text/plain", "Bad request", False)
+                    break
+                if request is None:
+                    break
+
+                handler = self.routes.get((request.method, request.path))
+                if handler is None:
+                    status, content_type, body = 404, "text/plain", "Not found"
+                else:
+                    try:
+                        status, content_type, body = await handler(request)
+                    except Exception as e:
+                        log("http server", f"Failed to handle {request.method} {request.path}: {e}")
+                        status, content_type, body = 500, "text/plain", "Internal error"
+
+                keep_alive = request.headers.get("connection", "").lower() != "close"
+                self._write_response(writer, status, content_type, body, keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (asyncio.TimeoutError, ConnectionError):
+            pass
+        finally:
+            writer.close()
@@ -0,0 +1,101 @@
+"""Schedule lookups through inline queries.
+
+Typing "@bot today" or "@bot week 2" in any chat offers the schedule as
+an inline result, which the user sends as their own message, so nothing
+is left for the bot to track or delete. Result sets are built once per
+rendered message and schedule version and kept in memory, and Telegram
+is allowed to cache them for everybody until the message would change.
+"""
+
+from telegram import InlineQueryResultArticle, InputTextMessageContent, LinkPreviewOptions
+
+import chunker
+import message_cache
+
+
+# Message types, as in messages.py
+NOW = 0
+TODAY = 1
+WEEK = 2
+
+QUERIES = {"now": NOW, "today": TODAY, "week": WEEK}
+WEEK_NUMBERS = (1, 2)
+
+
+def parse_query(query):
+    """
+    Find the lookups an inline query asks for.
+
+    A partly typed word matches every lookup it starts, an empty query
+    matches all of them, "week" may be followed by a week number.
+
+    Parameters:
+        query (str): The inline query text.
+
+    Returns:
+        list: (message type, week number or None) pairs, empty if nothing matches.
+    """
+    words = query.lower().split()
+    if not words:
+        return [(msg_type, None) for msg_type in QUERIES.values()]
+
+    week = None
+    if len(words) > 1 and words[1].isdigit() and int(words[1]) in WEEK_NUMBERS:
+        week = int(words[1])
+    return [(msg_type, week if msg_type == WEEK else None)
+            for name, msg_type in QUERIES.items() if name.startswith(words[0])]
+
+
+def _description(text):
+    """First lines of a message as plain text, for the result preview."""
+    plain = text.translate(str.maketrans("", "", "*`\\\t"))
+    return " ".join(line for line in plain.splitlines()[:3] if line.strip())
+
+
+class InlineResults:
+    def __init__(self, render, titles, maxsize=64):
+        """
+        Parameters:
+            render (function): (message type, week or None) -> message text.
+            titles (list): Result titles indexed by message type.
+            maxsize (int): Max result sets kept in memory.
+        """
+        self.render = render
+        self.titles = titles
+        self.cache = message_cache.MessageCache(maxsize)
+        self.built = 0  # Result sets built, makes result ids unique
+
+    def _build(self, msg_type, week, text):
+        self.built += 1
+        title = self.titles[msg_type] + (f" {week}" if week else "")
+        chunks = chunker.split_message(text)
+        return [InlineQueryResultArticle(
+            id=f"{self.built}.{index}",
+            title=title if len(chunks) == 1 else f"{title} ({index + 1}/{len(chunks)})",
+            description=_description(chunk),
+            input_message_content=InputTextMessageContent(
+                chunk, parse_mode="Markdown", link_preview_options=LinkPreviewOptions(is_disabled=True)),
+        ) for index, chunk in enumerate(chunks)]
+
+    def get(self, lookups, version):
+        """
+        Get the results for parsed lookups.
+
+        Parameters:
+            lookups (list): Pairs from parse_query.
+            version (int): The schedule version.
+
+        Returns:
+            list: InlineQueryResultArticle objects, at most 50 as Telegram allows.
+        """
+        results = []
+        for msg_type, week in lookups:
+            # Rendered messages come from the message cache, so an unchanged text is the same object
+            text = self.render(msg_type, week)
+            key = (msg_type, week, text)
+            articles = self.cache.get(key, version)
+            if articles is message_cache.MISS:
+                articles = self._build(msg_type, week, text)
+                self.cache.put(key, articles, version)
+            results += articles
+        return results[:50]
@@ -0,0 +1,29 @@
+"""Bot API request layer that records metrics for every call."""
+
+from time import perf_counter
+
+from telegram.request import HTTPXRequest
+
+from metrics import registry
+
+
+class InstrumentedRequest(HTTPXRequest):
+    """HTTPXRequest that counts and times requests per Bot API method."""
+
+    async def do_request(self, url, method, *args, **kwargs):
+        labels = (("method", url.rsplit("/", 1)[-1]),)
+        started = perf_counter()
+        try:
+            code, payload = await super().do_request(url, method, *args, **kwargs)
+        except Exception:
+            registry.inc("calenbot_bot_api_errors_total", labels)
+            raise
+        finally:
+            registry.observe("calenbot_bot_api_seconds", perf_counter() - started, labels)
+
+        # Flood control answers with 429, the bot raises RetryAfter from it
+        if code == 429:
+            registry.inc("calenbot_bot_api_retry_after_total", labels)
+        elif code >= 400:
+            registry.inc("calenbot_bot_api_errors_total", labels)
+        return code, payload
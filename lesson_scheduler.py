@@ -0,0 +1,103 @@
+"""Lesson alerts driven by the timetable.
+
+Instead of waking up on a fixed interval, the scheduler compiles the
+lesson start times and the stored schedule into the exact, timezone-aware
+moments of today's alerts. Only slots that have a lesson get a job, so
+the bot does nothing between lessons, on empty days and on weekends. A
+job at midnight plans the next day, and the plan is rebuilt whenever the
+schedule changes. An optional prepare job runs shortly before every
+alert, so its message can be rendered ahead of time.
+"""
+
+from datetime import datetime, timedelta, time
+from time import time as now_timestamp
+from zoneinfo import ZoneInfo
+
+import fetch_schedule
+from metrics import registry
+from timeslots import week_number
+from logger import log_action as log
+
+
+class LessonScheduler:
+    def __init__(self, timestamps, weekdays, timezone, lead, callback, prepare=None, prepare_ahead=60):
+        """
+        Parameters:
+            timestamps (list): Lesson start times in HH:MM format.
+            weekdays (list): Names of the weekdays with lessons, starting on Monday.
+            timezone (str): IANA name of the timezone the timestamps are in.
+            lead (int): Seconds between an alert and the start of its lesson.
+            callback (function): JobQueue callback, job.data is (lesson_index, day_index, week).
+            prepare (function, optional): JobQueue callback run before each alert, same job.data.
+            prepare_ahead (int): Seconds between the prepare job and its alert.
+        """
+        self.timezone = ZoneInfo(timezone)
+        self.weekdays = weekdays
+        self.lead = timedelta(seconds=lead)
+        self.callback = callback
+        self.prepare = prepare
+        self.prepare_ahead = timedelta(seconds=prepare_ahead)
+        self.starts = [datetime.strptime(timestamp, "%H:%M").time() for timestamp in timestamps]
+        self.timestamps = timestamps
+        self.planned = {}  # details -> Unix timestamp the alert is planned for
+
+    def now(self):
+        return datetime.now(self.timezone)
+
+    def alerts_for(self, day):
+        """
+        Compile the alerts of a day.
+
+        Parameters:
+            day (date): The date in the scheduler's timezone.
+
+        Returns:
+            list: (alert datetime, (lesson_index, day_index, week)) for every slot with a lesson.
+        """
+        day_index = day.weekday()
+        if day_index >= len(self.weekdays):
+            return []
+
+        week = week_number(day)
+        weekday = self.weekdays[day_index]
+        alerts = []
+        for lesson_index, (timestamp, start) in enumerate(zip(self.timestamps, self.starts)):
+            if fetch_schedule.get_lesson(self.weekdays, week, weekday, timestamp) is None:
+                continue
+            alert_at = datetime.combine(day, start, tzinfo=self.timezone) - self.lead
+            alerts.append((alert_at, (lesson_index, day_index, week)))
+        return alerts
+
+    def plan(self, job_queue, now=None):
+        """Replace the planned alerts with the ones still ahead today."""
+        now = now or self.now()
+        # Only jobs still pending, the ones that already ran are gone from the queue
+        for name in ("lesson_alert", "lesson_alert_prepare"):
+            for job in job_queue.get_jobs_by_name(name):
+                job.schedule_removal()
+        self.planned = {}
+        alerts = [(alert_at, details) for alert_at, details in self.alerts_for(now.date()) if alert_at > now]
+        for alert_at, details in alerts:
+            self.planned[details] = alert_at.timestamp()
+            job_queue.run_once(self.callback_alert, when=alert_at, data=details, name="lesson_alert")
+            prepare_at = alert_at - self.prepare_ahead
+            if self.prepare and prepare_at > now:
+                job_queue.run_once(self.prepare, when=prepare_at, data=details, name="lesson_alert_prepare")
+        log("bot handler", f"Planned {len(alerts)} lesson alerts for {now.date()}")
+
+    async def callback_alert(self, context):
+        """JobQueue callback, records how late the alert runs and sends it."""
+        planned = self.planned.get(context.job.data)
+        if planned is not None:
+            registry.observe("calenbot_scheduler_lag_seconds", max(0.0, now_timestamp() - planned))
+        await self.callback(context)
+
+    async def callback_rollover(self, context):
+        """JobQueue callback, plans the alerts of the new day."""
+        self.plan(context.job_queue)
+
+    def start(self, job_queue):
+        """Plan today's alerts and roll over to the next day at midnight."""
+        self.plan(job_queue)
+        job_queue.run_daily(self.callback_rollover, time=time(0, 0, tzinfo=self.timezone),
+                            name="lesson_rollover")
@@ -1,23 +1,151 @@
+"""Logging for the bot.
+
+Every module logs through the root logger, which only puts records on a
+queue. A listener thread formats them and writes them to the console
+and a rotating log file, so logging never blocks the event loop on disk
+I/O. Records can be written as plain text or as JSON lines with
+structured fields, and noisy loggers (httpx logs every Bot API request)
+are sampled before they are queued.
+"""
+
+import atexit
+import json
 import logging
+import logging.handlers
+import queue
+from datetime import datetime
+
+
+TEXT_FORMAT = "%(asctime)s %(message)s"
+DATE_FORMAT = "%m/%d %H:%M:%S"
+
+
+class SamplingFilter(logging.Filter):
+    """Keep only a share of the records below WARNING from chosen loggers."""
+
+    def __init__(self, rates):
+        """
+        Parameters:
+            rates (dict): Logger name -> share of records to keep, 0 drops all of them.
+                Child loggers share the rate of their parent.
+        """
+        super().__init__()
+        self.rates = rates
+        self.every = {}  # Logger name -> keep every n-th record, None if not sampled
+        self.counts = {}
+
+    def _every(self, name):
+        for prefix, rate in self.rates.items():
+            if name == prefix or name.startswith(prefix + "."):
+                return round(1 / rate) if rate > 0 else 0
+        return None
 
-class IgnorePostFilter(logging.Filter):
     def filter(self, record):
-        return 'HTTP Request: POST' not in record.getMessage()
+        if record.levelno >= logging.WARNING:
+            return True
+        name = record.name
+        if name not in self.every:
+            self.every[name] = self._every(name)
+        every = self.every[name]
+        if every is None:
+            return True
+        if not every:
+            return False
+        count = self.counts.get(name, 0)
+        self.counts[name] = count + 1
+        return count % every == 0
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, with the structured fields of the record."""
+
+    def format(self, record):
+        entry = {
+            "time": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+        }
+        who = getattr(record, "who", None)
+        if who:
+            entry["who"] = who
+            entry["message"] = record.what
+        else:
+            entry["message"] = record.getMessage()
+        entry.update(getattr(record, "fields", None) or {})
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
 
-# Initialize root logging
+# Initialize root logging, every record goes through the queue
 root_logger = logging.getLogger()
 root_logger.setLevel(logging.INFO)
 
-handler1 = logging.StreamHandler()
-handler1.setFormatter(logging.Formatter("%(asctime)s %(message)s",datefmt="%m/%d %H:%M:%S"))
-handler1.addFilter(IgnorePostFilter())
-root_logger.addHandler(handler1)
+_queue = queue.SimpleQueue()
+_queue_handler = logging.handlers.QueueHandler(_queue)
+root_logger.addHandler(_queue_handler)
+_listener = None
+
+
+def configure(path="./data/bot.log", json_lines=False, max_bytes=5 * 1024 * 1024, backups=5,
+              when=None, sampling=None, level="INFO"):
+    """
+    (Re)start the logging pipeline.
+
+    Parameters:
+        path (str): Log file.
+        json_lines (bool): Write JSON lines instead of plain text.
+        max_bytes (int): Size at which the log file is rotated.
+        backups (int): Rotated files to keep.
+        when (str, optional): Rotate by time instead of size, e.g. "midnight".
+        sampling (dict, optional): Logger name -> share of its records below WARNING to keep.
+        level (str): Lowest level that is logged.
+    """
+    global _listener
+    shutdown()
+
+    if when:
+        file_handler = logging.handlers.TimedRotatingFileHandler(path, when=when, backupCount=backups,
+                                                                 encoding="utf-8")
+    else:
+        file_handler = logging.handlers.RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backups,
+                                                            encoding="utf-8")
+    stream_handler = logging.StreamHandler()
+
+    formatter = JsonFormatter() if json_lines else logging.Formatter(TEXT_FORMAT, datefmt=DATE_FORMAT)
+    for handler in (stream_handler, file_handler):
+        handler.setFormatter(formatter)
+
+    # Sample before queueing, so dropped records cost no formatting at all
+    for old in list(_queue_handler.filters):
+        _queue_handler.removeFilter(old)
+    _queue_handler.addFilter(SamplingFilter(sampling or {}))
+    root_logger.setLevel(level)
+
+    _listener = logging.handlers.QueueListener(_queue, stream_handler, file_handler)
+    _listener.start()
+
+
+def shutdown():
+    """Write out the queued records and close the log file."""
+    global _listener
+    if _listener is None:
+        return
+    _listener.stop()
+    for handler in _listener.handlers:
+        handler.close()
+    _listener = None
+
+
+configure(sampling={"httpx": 0})
+atexit.register(shutdown)
+
 
-handler2 = logging.FileHandler("./data/bot.log")
-handler2.setFormatter(logging.Formatter("%(asctime)s %(message)s",datefmt="%m/%d %H:%M:%S"))
-handler2.addFilter(IgnorePostFilter())
-root_logger.addHandler(handler2)
+def log_action(who, what, **fields):
+    """
+    Print log info in a convinient way.
 
-def log_action(who, what):
-    """Print log info in a convinient way."""
-    root_logger.info("%s: %s", who.upper(), what)
+    Parameters:
+        who (str): Part of the bot that logs.
+        what (str): The message.
+        **fields: Structured fields for JSON lines, e.g. chat, command or latency.
+    """
+    root_logger.info("%s: %s", who.upper(), what, extra={"who": who, "what": what, "fields": fields})
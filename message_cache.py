@@ -0,0 +1,49 @@
+"""Bounded LRU cache for rendered bot messages."""
+
+from collections import OrderedDict
+from time import time
+
+# Returned by MessageCache.get when there is no usable entry
+MISS = object()
+
+
+class MessageCache:
+    def __init__(self, maxsize=64):
+        self.maxsize = maxsize  # Max number of rendered messages kept in memory
+        self.version = None  # Schedule data version the entries were rendered from
+        self.entries = OrderedDict()  # key -> (value, expires_at)
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, version, now=None):
+        """Return the cached value for key or MISS if absent, expired or outdated."""
+        if version != self.version:
+            self.clear()
+            self.version = version
+
+        entry = self.entries.get(key)
+        if entry is not None:
+            value, expires_at = entry
+            if expires_at is None or (now or time()) < expires_at:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return value
+            del self.entries[key]
+
+        self.misses += 1
+        return MISS
+
+    def put(self, key, value, version, expires_at=None):
+        """Store value under key until the Unix timestamp expires_at (None means until data changes)."""
+        if version != self.version:
+            self.clear()
+            self.version = version
+
+        self.entries[key] = (value, expires_at)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        """Drop all entries."""
+        self.entries.clear()
@@ -0,0 +1,104 @@
+"""Schedule messages the bot replies with.
+
+Messages are rendered from the compiled schedule index for the current
+lesson slot or for given time details, and kept in a cache until either
+the schedule or the slot they depend on changes. This used to live in
+config.py, it's code rather than settings and kept here, so a config.py
+copied from an older example_config.py keeps working.
+"""
+
+import fetch_schedule
+import message_cache
+
+
+# Message types
+MESSAGE_NOW = 0
+MESSAGE_TODAY = 1
+MESSAGE_WEEK = 2
+MESSAGE_ALL = 3
+
+
+class MessageRenderer:
+    def __init__(self, text, time_slots, maxsize=64):
+        """
+        Parameters:
+            text (Text): Text templates for bot messages.
+            time_slots (timeslots.TimeSlots): Lookup of the current lesson slot.
+            maxsize (int): Max rendered messages kept in memory.
+        """
+        self.text = text
+        self.time_slots = time_slots
+        self.cache = message_cache.MessageCache(maxsize)
+
+    def render(self, msg_type, link=True, info=False, return_false=False, callback_message=False,
+               time_details=None):
+        """
+        Generate a message based on the type specified.
+
+        Parameters:
+            msg_type (int): Type of message to generate.
+            link (bool): Whether to include links in the message.
+            info (bool): Whether to include additional information.
+            return_false (bool): Whether to return False if date out of schedule range.
+            callback_message (bool): Changes the text of the message for MESSAGE_NOW
+            time_details (tuple, optional): (lesson_index, day_index, week) to use instead of the current time.
+
+        Returns:
+            str: The generated message.
+        """
+        text = self.text
+        form_sch = fetch_schedule.form_schedule
+        reply_text = ""
+        l, d, w = time_details or self.time_slots.details()
+
+        # Serve from cache, keyed only by what the message type depends on
+        key = {MESSAGE_NOW: (l, d, w), MESSAGE_TODAY: (d, w), MESSAGE_WEEK: (w,)}.get(msg_type, ())
+        key = (msg_type,) + key + (info, link, return_false, callback_message)
+        version = fetch_schedule.get_schedule_version()
+
+        cached = self.cache.get(key, version)
+        if cached is not message_cache.MISS:
+            return cached
+
+        if msg_type == MESSAGE_NOW:
+            lesson = form_sch(text, lesson_index=l, day_index=d, week=w, include_teacher_info=info, include_links=link)
+            next_lesson = form_sch(text, lesson_index=(l+1), day_index=d, week=w, include_teacher_info=info, include_links=link)
+            current_lesson_text = text.scheduled_lesson if callback_message else text.current_lesson
+            reply_text += current_lesson_text if lesson else text.no_lesson
+            reply_text += lesson
+            reply_text += text.next_lesson + next_lesson if next_lesson else ""
+            if return_false and reply_text == text.no_lesson:
+                reply_text = False
+        elif msg_type == MESSAGE_TODAY:
+            day = form_sch(text, day_index=d, week=w, include_teacher_info=info, include_links=link)
+            reply_text += day if day else text.no_day
+        elif msg_type == MESSAGE_WEEK:
+            week = form_sch(text, week=w, include_teacher_info=info, include_links=link)
+            reply_text += week if week else text.err
+        elif msg_type == MESSAGE_ALL:
+            week_1 = form_sch(text, week=1, include_teacher_info=info, include_links=link)
+            week_2 = form_sch(text, week=2, include_teacher_info=info, include_links=link)
+            all = week_1 + week_2  # Split into messages between days when sent
+            reply_text += all if all else text.err
+
+        # A message for explicit time details never goes stale by itself
+        expires_at = None if time_details and msg_type == MESSAGE_NOW else self.expiry(msg_type)
+        self.cache.put(key, reply_text, version, expires_at)
+        return reply_text
+
+    def expiry(self, msg_type):
+        """
+        Get the moment a message of the type may start to read differently.
+
+        Parameters:
+            msg_type (int): Type of message, as in render.
+
+        Returns:
+            float or None: Unix timestamp, None if only a schedule change affects the message.
+        """
+        # /now changes with every lesson, /today and /week at midnight at most
+        if msg_type == MESSAGE_NOW:
+            return self.time_slots.next_boundary()
+        if msg_type in (MESSAGE_TODAY, MESSAGE_WEEK):
+            return self.time_slots.day_end_at()
+        return None
@@ -0,0 +1,215 @@
+"""Runtime metrics.
+
+Counters and latency histograms live in memory in one registry, which
+every module records into. Gauges are read from their owners (caches,
+queues) only when the metrics are rendered, so they cost nothing on the
+hot path. The registry renders itself in the Prometheus text format and
+as a short human-readable summary for the /stats command.
+"""
+
+from bisect import bisect_left
+from contextlib import contextmanager
+from functools import wraps
+import logging
+from time import perf_counter
+
+
+# Upper bounds of the latency buckets, in seconds
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+class Histogram:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # The last one counts values above every bound
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, fraction):
+        """Upper bound of the bucket holding the quantile, inf if it's above every bound."""
+        rank = fraction * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+
+class Registry:
+    def __init__(self):
+        self.counters = {}  # (name, labels) -> value
+        self.histograms = {}  # (name, labels) -> Histogram
+        self.gauges = {}  # name -> function returning a value or {labels: value}
+        self.help = {}  # name -> description
+
+    def describe(self, name, text):
+        self.help[name] = text
+
+    def inc(self, name, labels=(), value=1):
+        """
+        Add to a counter.
+
+        Parameters:
+            name (str): Metric name.
+            labels (tuple): (label, value) pairs.
+            value (float): Amount to add.
+        """
+        key = (name, labels)
+        self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, value, labels=()):
+        """Record a value in a histogram."""
+        key = (name, labels)
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = Histogram()
+        histogram.observe(value)
+
+    @contextmanager
+    def timer(self, name, labels=()):
+        """Record the duration of a block in a histogram."""
+        started = perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, perf_counter() - started, labels)
+
+    def gauge(self, name, func, text=None):
+        """Register a gauge read from func whenever metrics are rendered."""
+        self.gauges[name] = func
+        if text:
+            self.help[name] = text
+
+    def _gauge_values(self):
+        for name, func in self.gauges.items():
+            try:
+                value = func()
+            except Exception:  # A broken gauge must not take the others down
+                continue
+            values = value if isinstance(value, dict) else {(): value}
+            for labels, sample in values.items():
+                if sample is not None:
+                    yield name, labels, sample
+
+    @staticmethod
+    def _labels(labels, extra=()):
+        pairs = tuple(labels) + tuple(extra)
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{key}="{value}"' for key, value in pairs) + "}"
+
+    def render_prometheus(self):
+        """
+        Render all metrics in the Prometheus text exposition format.
+
+        Returns:
+            str: The metrics page.
+        """
+        lines = []
+        described = set()
+
+        def header(name, kind):
+            if name not in described:
+                described.add(name)
+                if name in self.help:
+                    lines.append(f"# HELP {name} {self.help[name]}")
+                lines.append(f"# TYPE {name} {kind}")
+
+        for (name, labels), value in sorted(self.counters.items()):
+            header(name, "counter")
+            lines.append(f"{name}{self._labels(labels)} {value}")
+
+        for (name, labels), histogram in sorted(self.histograms.items(), key=lambda item: item[0]):
+            header(name, "histogram")
+            cumulative = 0
+            for bound, count in zip(histogram.buckets, histogram.counts):
+                cumulative += count
+                lines.append(f"{name}_bucket{self._labels(labels, [('le', bound)])} {cumulative}")
+            lines.append(f"{name}_bucket{self._labels(labels, [('le', '+Inf')])} {histogram.count}")
+            lines.append(f"{name}_sum{self._labels(labels)} {histogram.sum}")
+            lines.append(f"{name}_count{self._labels(labels)} {histogram.count}")
+
+        for name, labels, value in self._gauge_values():
+            header(name, "gauge")
+            lines.append(f"{name}{self._labels(labels)} {value}")
+
+        return "\n".join(lines) + "\n"
+
+    def render_summary(self):
+        """
+        Render the most useful metrics as short plain text.
+
+        Returns:
+            str: One line per metric.
+        """
+        lines = []
+        for (name, labels), histogram in sorted(self.histograms.items(), key=lambda item: item[0]):
+            label = ",".join(str(label_value) for _, label_value in labels)
+            lines.append(f"{name}{'[' + label + ']' if label else ''}: n={histogram.count} "
+                         f"avg={histogram.sum / histogram.count * 1000:.1f}ms "
+                         f"p50<={histogram.quantile(0.5) * 1000:g}ms p99<={histogram.quantile(0.99) * 1000:g}ms")
+        for (name, labels), value in sorted(self.counters.items()):
+            label = ",".join(str(label_value) for _, label_value in labels)
+            lines.append(f"{name}{'[' + label + ']' if label else ''}: {value:g}")
+        for name, labels, value in self._gauge_values():
+            label = ",".join(str(label_value) for _, label_value in labels)
+            lines.append(f"{name}{'[' + label + ']' if label else ''}: {value:.3g}")
+        return "\n".join(lines)
+
+
+# Per-update log lines, with LOG_LEVEL = "DEBUG" in the config
+update_log = logging.getLogger("calenbot.updates")
+
+# The registry every module records into
+registry = Registry()
+
+registry.describe("calenbot_handler_seconds", "Time spent in update handlers.")
+registry.describe("calenbot_handler_errors_total", "Exceptions raised by update handlers.")
+registry.describe("calenbot_db_seconds", "Time spent in SQLite reads and write transactions.")
+registry.describe("calenbot_bot_api_seconds", "Duration of Bot API requests.")
+registry.describe("calenbot_bot_api_retry_after_total", "Bot API requests rejected by flood control.")
+registry.describe("calenbot_scheduler_lag_seconds", "Delay between a planned lesson alert and its job running.")
+registry.describe("calenbot_webhook_updates_total", "Webhook requests by result.")
+
+
+def ratio(hits, misses):
+    """Hit ratio, None until there was a lookup."""
+    total = hits + misses
+    return hits / total if total else None
+
+
+def track_handler(callback):
+    """Wrap an update handler callback to record its latency and errors."""
+    labels = (("handler", callback.__name__),)
+
+    @wraps(callback)
+    async def inner(update, context):
+        started = perf_counter()
+        try:
+            return await callback(update, context)
+        except Exception:
+            registry.inc("calenbot_handler_errors_total", labels)
+            raise
+        finally:
+            elapsed = perf_counter() - started
+            registry.observe("calenbot_handler_seconds", elapsed, labels)
+            if update_log.isEnabledFor(logging.DEBUG):
+                _log_update(update, callback.__name__, elapsed)
+    return inner
+
+
+def _log_update(update, handler, elapsed):
+    chat = update.effective_chat.id if update.effective_chat else None
+    text = update.effective_message.text if update.effective_message else None
+    command = text.split()[0] if text and text.startswith("/") else None
+    update_log.debug("Handled %s in %.1f ms", command or handler, elapsed * 1000,
+                     extra={"fields": {"chat": chat, "command": command, "handler": handler,
+                                       "latency": round(elapsed, 6)}})
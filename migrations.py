@@ -0,0 +1,128 @@
+"""Versioned schema of the bot's database.
+
+Every migration is a list of steps, SQL statements or functions taking a
+cursor, that brings the schema from one version to the next. The version
+a database is at is kept in PRAGMA user_version, so a database of any
+age is migrated in place by running the steps it hasn't seen yet, each
+migration in its own transaction. Append new migrations at the end and
+never change one that has been released.
+"""
+
+from logger import log_action as log
+
+
+def _fill_lesson_teachers(cursor):
+    """Copy the comma-joined teacher ids of every lesson into lesson_teachers."""
+    rows = cursor.execute("SELECT id, teacher_id FROM lessons").fetchall()
+    cursor.executemany(
+        "INSERT OR IGNORE INTO lesson_teachers (lesson_id, position, teacher_id) VALUES (?, ?, ?)",
+        [(lesson_id, position, int(teacher_id))
+         for lesson_id, teacher_ids in rows if teacher_ids
+         for position, teacher_id in enumerate(str(teacher_ids).split(","))])
+
+
+MIGRATIONS = [
+    # 1: The tables as they were created before migrations existed
+    ['''
+    CREATE TABLE IF NOT EXISTS lessons (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        subject TEXT,
+        type TEXT,
+        link TEXT,
+        teacher_id TEXT,
+        FOREIGN KEY (teacher_id) REFERENCES teachers (id),
+        UNIQUE(subject, type, teacher_id)
+    )''', '''
+    CREATE TABLE IF NOT EXISTS teachers (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT UNIQUE,
+        email TEXT,
+        phone TEXT
+    )''', '''
+    CREATE TABLE IF NOT EXISTS schedule (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        timestamp TEXT,
+        weekday TEXT,
+        lesson_id INTEGER,
+        week_number INTEGER,
+        FOREIGN KEY (lesson_id) REFERENCES lessons(id),
+        UNIQUE(timestamp, weekday, lesson_id, week_number)
+    )''', '''
+    CREATE TABLE IF NOT EXISTS schedule_snapshot (
+        week_number INTEGER PRIMARY KEY,
+        fingerprint TEXT
+    )''', '''
+    CREATE TABLE IF NOT EXISTS schedule_cells (
+        week_number INTEGER,
+        weekday TEXT,
+        timestamp TEXT,
+        fingerprint TEXT,
+        PRIMARY KEY (week_number, weekday, timestamp)
+    )''', '''
+    CREATE TABLE IF NOT EXISTS approved_groups (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        group_name TEXT UNIQUE,
+        group_data TEXT
+    )'''],
+
+    # 2: Teachers of a lesson in their own table, in page order. lessons.teacher_id
+    # stays as part of the lesson's identity (UNIQUE), but is no longer parsed
+    ['''
+    CREATE TABLE lesson_teachers (
+        lesson_id INTEGER NOT NULL REFERENCES lessons (id),
+        position INTEGER NOT NULL,
+        teacher_id INTEGER NOT NULL REFERENCES teachers (id),
+        PRIMARY KEY (lesson_id, position)
+    ) WITHOUT ROWID''',
+     _fill_lesson_teachers],
+
+    # 3: Covering index for slot lookups and per-week deletes of the schedule
+    ['''
+    CREATE INDEX schedule_slot ON schedule (week_number, weekday, timestamp, lesson_id)'''],
+]
+
+
+def migrate(conn):
+    """
+    Bring a database up to the latest schema version.
+
+    Parameters:
+        conn (sqlite3.Connection): An autocommit connection.
+
+    Returns:
+        int: Number of migrations applied.
+    """
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    if version >= len(MIGRATIONS):
+        return 0
+
+    applied = 0
+    for number, steps in enumerate(MIGRATIONS[version:], start=version + 1):
+        cursor = conn.cursor()
+        cursor.execute("BEGIN IMMEDIATE")
+        try:
+            # Another process may have got here first
+            if cursor.execute("PRAGMA user_version").fetchone()[0] >= number:
+                conn.commit()
+                continue
+            for step in steps:
+                if callable(step):
+                    step(cursor)
+                else:
+                    cursor.execute(step)
+            # Stored in the database header, so it commits with the steps
+            cursor.execute(f"PRAGMA user_version = {number}")
+        except BaseException:
+            conn.rollback()
+            raise
+        else:
+            conn.commit()
+            applied += 1
+            log("database", f"Migrated to schema version {number}")
+        finally:
+            cursor.close()
+
+    # New tables and indexes need statistics for the query planner
+    if applied:
+        conn.execute("ANALYZE")
+    return applied
@@ -0,0 +1,250 @@
+"""Central outbound queue for every message the bot sends.
+
+Telegram allows about 30 messages per second overall, 20 per minute in
+a group and about one per second in a private chat, and answers with
+RetryAfter when a bot goes faster. All sends go through a single
+dispatcher instead, which paces them with token buckets per chat and for
+the whole bot. Each chat has its own FIFO lane with at most one message
+in flight, so parts of a long reply keep their order. Lanes have
+priorities, so scheduled lesson alerts go out before ad-hoc replies
+waiting at the same time. On RetryAfter, the chat is paused for the
+requested time and the message is retried.
+"""
+
+import asyncio
+from collections import deque
+from datetime import timedelta
+from itertools import count
+from time import monotonic
+
+from telegram.error import RetryAfter
+
+from logger import log_action as log
+from rate_limiter import TokenBucket
+
+
+# Priorities, lower goes first
+ALERT = 0  # Scheduled lesson alerts
+REPLY = 1  # Replies to commands
+
+
+class Outgoing:
+    __slots__ = ("priority", "seq", "chat_id", "kwargs", "future", "attempts")
+
+    def __init__(self, priority, seq, chat_id, kwargs, future):
+        self.priority = priority
+        self.seq = seq  # Enqueue order, breaks ties between equal priorities
+        self.chat_id = chat_id
+        self.kwargs = kwargs  # Arguments for Bot.send_message
+        self.future = future  # Resolved with the sent Message
+        self.attempts = 0
+
+
+class Outbox:
+    def __init__(self, global_rate=30, group_rate=20, private_rate=60, burst=5, max_retries=3):
+        """
+        Parameters:
+            global_rate (float): Messages per second for the whole bot.
+            group_rate (float): Messages per minute in one group.
+            private_rate (float): Messages per minute in one private chat.
+            burst (int): Messages a chat may get at once before pacing starts.
+            max_retries (int): Retries of a message after RetryAfter.
+        """
+        self.group_rate = group_rate / 60
+        self.private_rate = private_rate / 60
+        self.burst = burst
+        self.max_retries = max_retries
+        self.global_bucket = TokenBucket(global_rate, global_rate, monotonic())
+
+        self.lanes = {}  # chat_id -> tuple of deques, one per priority
+        self.chat_buckets = {}  # chat_id -> TokenBucket
+        self.paused_until = {}  # chat_id -> monotonic time RetryAfter allows sending again
+        self.in_flight = set()  # Chats with a message being sent
+        self.sending = set()  # Running send tasks, referenced so they aren't garbage collected
+        self.seq = count()
+
+        self.bot = None
+        self.worker = None
+        self.wakeup = None
+
+        # Counters for monitoring
+        self.stats = {"sent": 0, "failed": 0, "retry_after": 0}
+
+    def start(self, bot):
+        """Start dispatching, must be called from the bot's event loop."""
+        self.bot = bot
+        self.wakeup = asyncio.Event()
+        self.worker = asyncio.create_task(self._dispatch())
+
+    async def close(self):
+        """Stop dispatching, let the messages being sent finish and fail the ones still waiting."""
+        if self.worker:
+            self.worker.cancel()
+            try:
+                await self.worker
+            except asyncio.CancelledError:
+                pass
+            self.worker = None
+        await asyncio.gather(*self.sending, return_exceptions=True)
+        for lane in self.lanes.values():
+            for queue in lane:
+                for item in queue:
+                    if not item.future.done():
+                        item.future.cancel()
+        self.lanes.clear()
+
+    def enqueue(self, chat_id, text, priority=REPLY, **kwargs):
+        """
+        Queue a message without waiting for it.
+
+        Messages queued for a chat are sent in order, so parts of a long
+        reply can be queued back to back.
+
+        Parameters:
+            chat_id (int): The chat to send to.
+            text (str): The message text.
+            priority (int): ALERT or REPLY.
+            **kwargs: Other arguments for Bot.send_message.
+
+        Returns:
+            asyncio.Future: Resolves to the sent telegram.Message.
+        """
+        future = asyncio.get_running_loop().create_future()
+        kwargs.update(chat_id=chat_id, text=text)
+        lane = self.lanes.get(chat_id)
+        if lane is None:
+            lane = self.lanes[chat_id] = (deque(), deque())
+        lane[priority].append(Outgoing(priority, next(self.seq), chat_id, kwargs, future))
+        self.wakeup.set()
+        return future
+
+    async def send_message(self, chat_id, text, priority=REPLY, **kwargs):
+        """
+        Queue a message and wait until it is sent, see enqueue.
+
+        Returns:
+            telegram.Message: The sent message.
+        """
+        return await self.enqueue(chat_id, text, priority, **kwargs)
+
+    def queued(self, chat_id):
+        """Number of messages waiting for a chat, the one being sent included."""
+        lane = self.lanes.get(chat_id)
+        waiting = len(lane[0]) + len(lane[1]) if lane else 0
+        return waiting + (chat_id in self.in_flight)
+
+    def _bucket(self, chat_id, now):
+        bucket = self.chat_buckets.get(chat_id)
+        if bucket is None:
+            rate = self.group_rate if chat_id < 0 else self.private_rate
+            bucket = self.chat_buckets[chat_id] = TokenBucket(self.burst, rate, now)
+        else:
+            bucket.refill(now)
+        return bucket
+
+    def _next_ready(self, now):
+        """
+        Pick the chat whose head message should go next.
+
+        Returns:
+            tuple: (chat_id or None, seconds until some chat may become ready).
+        """
+        best, best_key, wait = None, None, None
+        for chat_id, lane in self.lanes.items():
+            if chat_id in self.in_flight:
+                continue
+            head = lane[0][0] if lane[0] else lane[1][0]
+
+            # Chats still paused or out of tokens only tell when to look again
+            delay = self.paused_until.get(chat_id, now) - now
+            bucket = self._bucket(chat_id, now)
+            if bucket.tokens < 1:
+                delay = max(delay, (1 - bucket.tokens) / bucket.refill_rate)
+            if delay > 0:
+                wait = delay if wait is None else min(wait, delay)
+                continue
+
+            key = (head.priority, head.seq)
+            if best_key is None or key < best_key:
+                best, best_key = chat_id, key
+        return best, wait
+
+    async def _dispatch(self):
+        while True:
+            now = monotonic()
+            self.global_bucket.refill(now)
+            if self.global_bucket.tokens < 1:
+                await asyncio.sleep((1 - self.global_bucket.tokens) / self.global_bucket.refill_rate)
+                continue
+
+            chat_id, wait = self._next_ready(now)
+            if chat_id is None:
+                # Sleep until a chat becomes ready or a new message arrives
+                self.wakeup.clear()
+                try:
+                    await asyncio.wait_for(self.wakeup.wait(), timeout=wait)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            lane = self.lanes[chat_id]
+            item = (lane[0] or lane[1]).popleft()
+            if not (lane[0] or lane[1]):
+                del self.lanes[chat_id]
+            if item.future.done():  # The sender gave up waiting
+                continue
+            self.global_bucket.tokens -= 1
+            self.chat_buckets[chat_id].tokens -= 1
+            self.in_flight.add(chat_id)
+            task = asyncio.create_task(self._send(item))
+            self.sending.add(task)
+            task.add_done_callback(self.sending.discard)
+
+    async def _send(self, item):
+        try:
+            message = await self.bot.send_message(**item.kwargs)
+        except RetryAfter as e:
+            self.stats["retry_after"] += 1
+            retry_after = e.retry_after
+            if isinstance(retry_after, timedelta):
+                retry_after = retry_after.total_seconds()
+            self.paused_until[item.chat_id] = monotonic() + retry_after
+            item.attempts += 1
+            if item.attempts > self.max_retries:
+                self.stats["failed"] += 1
+                if not item.future.done():
+                    item.future.set_exception(e)
+            else:
+                # Back to the front of its lane, so the chat keeps its order
+                log("bot handler", f"Flood control in {item.chat_id}, retrying in {retry_after}s")
+                lane = self.lanes.get(item.chat_id)
+                if lane is None:
+                    lane = self.lanes[item.chat_id] = (deque(), deque())
+                lane[item.priority].appendleft(item)
+        except Exception as e:
+            self.stats["failed"] += 1
+            if not item.future.done():
+                item.future.set_exception(e)
+        else:
+            self.stats["sent"] += 1
+            if not item.future.done():
+                item.future.set_result(message)
+        finally:
+            self.in_flight.discard(item.chat_id)
+            self.wakeup.set()
+
+    def evict(self, now=None):
+        """
+        Drop full buckets and expired pauses of chats with nothing queued.
+
+        Returns:
+            int: Number of evicted buckets.
+        """
+        now = monotonic() if now is None else now
+        for chat_id in [chat_id for chat_id, until in self.paused_until.items() if until <= now]:
+            del self.paused_until[chat_id]
+        full = [chat_id for chat_id, bucket in self.chat_buckets.items()
+                if chat_id not in self.lanes and bucket.is_full(now)]
+        for chat_id in full:
+            del self.chat_buckets[chat_id]
+        return len(full)
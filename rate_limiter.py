@@ -0,0 +1,97 @@
+"""Hierarchical token-bucket rate limiting.
+
+A request has to pass three levels of buckets: one for the whole bot, one
+per chat and one per user in a chat. Every check is O(1), and a noisy chat
+only drains its own bucket, so it can't lock other chats out.
+"""
+
+from time import monotonic
+
+
+class TokenBucket:
+    __slots__ = ("capacity", "refill_rate", "tokens", "updated")
+
+    def __init__(self, capacity, refill_rate, now):
+        self.capacity = capacity  # Max tokens, i.e. the allowed burst
+        self.refill_rate = refill_rate  # Tokens added per second
+        self.tokens = capacity
+        self.updated = now
+
+    def refill(self, now):
+        """Add the tokens accumulated since the last update."""
+        if now > self.updated:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.refill_rate)
+            self.updated = now
+
+    def is_full(self, now):
+        """A full bucket holds no state, so it can be dropped and recreated later."""
+        return self.tokens + (now - self.updated) * self.refill_rate >= self.capacity
+
+
+class RateLimiter:
+    def __init__(self, user_limit, chat_limit, global_limit, period):
+        """
+        Parameters:
+            user_limit (int): Requests one user may make in a chat per period.
+            chat_limit (int): Requests one chat may make per period.
+            global_limit (int): Requests the whole bot accepts per period.
+            period (float): The period in seconds, buckets refill fully over it.
+        """
+        self.user_limit = user_limit
+        self.chat_limit = chat_limit
+        self.period = period
+        self.global_bucket = TokenBucket(global_limit, global_limit / period, monotonic())
+        self.chat_buckets = {}  # chat_id -> TokenBucket
+        self.user_buckets = {}  # (chat_id, user_id) -> TokenBucket
+
+        # Counters for monitoring
+        self.stats = {"allowed": 0, "limited_user": 0, "limited_chat": 0, "limited_global": 0}
+
+    def _bucket(self, buckets, key, limit, now):
+        bucket = buckets.get(key)
+        if bucket is None:
+            bucket = buckets[key] = TokenBucket(limit, limit / self.period, now)
+        else:
+            bucket.refill(now)
+        return bucket
+
+    def allow(self, chat_id, user_id, now=None):
+        """
+        Take one token on every level, or none if any level is exhausted.
+
+        Returns:
+            bool: True if the request may be served.
+        """
+        now = monotonic() if now is None else now
+        user_bucket = self._bucket(self.user_buckets, (chat_id, user_id), self.user_limit, now)
+        chat_bucket = self._bucket(self.chat_buckets, chat_id, self.chat_limit, now)
+        self.global_bucket.refill(now)
+
+        # Check the narrowest level first, so abuse is attributed to its source
+        for bucket, counter in ((user_bucket, "limited_user"),
+                                (chat_bucket, "limited_chat"),
+                                (self.global_bucket, "limited_global")):
+            if bucket.tokens < 1:
+                self.stats[counter] += 1
+                return False
+
+        user_bucket.tokens -= 1
+        chat_bucket.tokens -= 1
+        self.global_bucket.tokens -= 1
+        self.stats["allowed"] += 1
+        return True
+
+    def evict(self, now=None):
+        """
+        Drop buckets that refilled completely, they are recreated full on next use.
+
+        Returns:
+            int: Number of evicted buckets.
+        """
+        now = monotonic() if now is None else now
+        evicted = 0
+        for buckets in (self.user_buckets, self.chat_buckets):
+            for key in [key for key, bucket in buckets.items() if bucket.is_full(now)]:
+                del buckets[key]
+                evicted += 1
+        return evicted
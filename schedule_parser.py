@@ -0,0 +1,233 @@
+"""HTML parser backends for timetable scraping.
+
+Every backend takes the page and returns the same batch of lessons, see
+parse_schedule. selectolax and lxml are optional and much faster than
+BeautifulSoup with html.parser, which stays as the fallback. Parser
+libraries are imported on first use, so importing this module is cheap.
+"""
+
+import re
+from functools import lru_cache
+from importlib.util import find_spec
+
+# Backends in order of preference when none is configured
+BACKEND_ORDER = ["selectolax", "lxml", "html.parser"]
+
+# Module each backend needs, imported lazily on first parse
+BACKEND_MODULES = {
+    "selectolax": "selectolax",
+    "lxml": "lxml",
+    "html.parser": "bs4",
+}
+
+
+@lru_cache(maxsize=1)
+def _lxml_selectors():
+    """Compile the lxml XPath selectors once, class tests match bs4's "one of the classes" semantics."""
+    from lxml import etree
+    return {
+        'table': etree.XPath("//table[@id=$table_id]"),
+        'rows': etree.XPath(".//tr"),
+        'cells': etree.XPath(".//td"),
+        'subject': etree.XPath(
+            ".//span[contains(concat(' ', normalize-space(@class), ' '), ' disLabel ')]"),
+        'teachers': etree.XPath(
+            ".//a[contains(concat(' ', normalize-space(@class), ' '), ' plainLink ')][not(ancestor::span)]"),
+        'links': etree.XPath(".//a"),
+    }
+
+@lru_cache(maxsize=8)
+def _lesson_type_matcher(lesson_types):
+    """Compile a regex matching any of the lesson types (never matches if there are none)."""
+    if not lesson_types:
+        return re.compile(r"(?!)")
+    return re.compile("|".join(re.escape(word) for word in lesson_types))
+
+def table_week_number(table_id):
+    """Week number of a schedule table, judging by its id."""
+    return 1 if "First" in table_id else 2
+
+def _lesson_type(link_texts, cell_text, lesson_types, matcher):
+    """Pick the lesson type from the first link mentioning one, else from the whole cell."""
+    source = next((text for text in link_texts if matcher.search(text)), cell_text)
+    return next((keyword for keyword in lesson_types if keyword in source), None)
+
+def _parse_cell(cell_text, subject, teacher_texts, link_texts, lesson_types, matcher):
+    """Turn the extracted texts of a cell into (subject, type, teacher_names)."""
+    teacher_names = tuple(text.strip() for text in teacher_texts if not matcher.search(text))
+    return subject, _lesson_type(link_texts, cell_text, lesson_types, matcher), teacher_names
+
+def parse_with_html_parser(html, table_ids, lesson_types):
+    """Parse the timetable with BeautifulSoup and the stdlib html.parser."""
+    from bs4 import BeautifulSoup
+
+    matcher = _lesson_type_matcher(tuple(lesson_types))
+    soup = BeautifulSoup(html, 'html.parser')
+    batch = []
+
+    for table_id in table_ids:
+        table = soup.find('table', {'id': table_id})
+        rows = table.find_all('tr')
+        header = [td.text.strip() for td in rows[0].find_all('td')][1:]
+        week_number = table_week_number(table_id)
+
+        for row in rows[1:]:
+            row_data = row.find_all('td')
+            timestamp = row_data[0].text.strip()[1:]
+            weekdays_data = row_data[1:]
+
+            for i, day in enumerate(header):
+                cell_content = weekdays_data[i]
+                cell_text = cell_content.text
+
+                # Skip empty cells and cells without a subject
+                if not cell_text.strip():
+                    continue
+                subject_span = cell_content.find('span', {'class': 'disLabel'})
+                if not subject_span:
+                    continue
+
+                teacher_texts = [a.text for a in cell_content.find_all('a', {'class': 'plainLink'})
+                                 if not a.find_parent('span')]
+                link_texts = [a.string for a in cell_content.find_all('a') if a.string]
+                batch.append((week_number, day, timestamp) + _parse_cell(
+                    cell_text, subject_span.text.strip(), teacher_texts, link_texts,
+                    lesson_types, matcher))
+
+    return batch
+
+def parse_with_lxml(html, table_ids, lesson_types):
+    """Parse the timetable with lxml and precompiled XPath selectors."""
+    from lxml import html as lxml_html
+
+    matcher = _lesson_type_matcher(tuple(lesson_types))
+    select = _lxml_selectors()
+    root = lxml_html.fromstring(html)
+    batch = []
+
+    for table_id in table_ids:
+        table = select['table'](root, table_id=table_id)[0]
+        rows = select['rows'](table)
+        header = [td.text_content().strip() for td in select['cells'](rows[0])][1:]
+        week_number = table_week_number(table_id)
+
+        for row in rows[1:]:
+            row_data = select['cells'](row)
+            timestamp = row_data[0].text_content().strip()[1:]
+            weekdays_data = row_data[1:]
+
+            for i, day in enumerate(header):
+                cell_content = weekdays_data[i]
+                cell_text = cell_content.text_content()
+
+                # Skip empty cells and cells without a subject
+                if not cell_text.strip():
+                    continue
+                subject_span = select['subject'](cell_content)
+                if not subject_span:
+                    continue
+
+                teacher_texts = [a.text_content() for a in select['teachers'](cell_content)]
+                link_texts = [a.text_content() for a in select['links'](cell_content)]
+                batch.append((week_number, day, timestamp) + _parse_cell(
+                    cell_text, subject_span[0].text_content().strip(), teacher_texts,
+                    link_texts, lesson_types, matcher))
+
+    return batch
+
+def _has_span_ancestor(node):
+    """Check whether a selectolax node is nested in a <span>."""
+    parent = node.parent
+    while parent is not None:
+        if parent.tag == 'span':
+            return True
+        parent = parent.parent
+    return False
+
+def parse_with_selectolax(html, table_ids, lesson_types):
+    """Parse the timetable with selectolax (lexbor engine) and CSS selectors."""
+    from selectolax.lexbor import LexborHTMLParser
+
+    matcher = _lesson_type_matcher(tuple(lesson_types))
+    tree = LexborHTMLParser(html)
+    batch = []
+
+    for table_id in table_ids:
+        table = tree.css_first(f'table[id="{table_id}"]')
+        rows = table.css('tr')
+        header = [td.text().strip() for td in rows[0].css('td')][1:]
+        week_number = table_week_number(table_id)
+
+        for row in rows[1:]:
+            row_data = row.css('td')
+            timestamp = row_data[0].text().strip()[1:]
+            weekdays_data = row_data[1:]
+
+            for i, day in enumerate(header):
+                cell_content = weekdays_data[i]
+                cell_text = cell_content.text()
+
+                # Skip empty cells and cells without a subject
+                if not cell_text.strip():
+                    continue
+                subject_span = cell_content.css_first('span.disLabel')
+                if subject_span is None:
+                    continue
+
+                teacher_texts = [a.text() for a in cell_content.css('a.plainLink')
+                                 if not _has_span_ancestor(a)]
+                link_texts = [a.text() for a in cell_content.css('a')]
+                batch.append((week_number, day, timestamp) + _parse_cell(
+                    cell_text, subject_span.text().strip(), teacher_texts, link_texts,
+                    lesson_types, matcher))
+
+    return batch
+
+BACKENDS = {
+    "selectolax": parse_with_selectolax,
+    "lxml": parse_with_lxml,
+    "html.parser": parse_with_html_parser,
+}
+
+@lru_cache(maxsize=None)
+def is_available(name):
+    """Check whether the module a backend needs is installed, without importing it."""
+    return find_spec(BACKEND_MODULES[name]) is not None
+
+def get_backend(name=None):
+    """
+    Returns the parse function of a backend.
+
+    Parameters:
+        name (str, optional): "selectolax", "lxml" or "html.parser",
+            None picks the fastest one installed.
+
+    Returns:
+        function: The backend's parse function.
+    """
+    if name is not None:
+        if name not in BACKENDS:
+            raise ValueError(f"Unknown HTML parser backend: {name}")
+        if not is_available(name):
+            raise ImportError(f"HTML parser backend {name} is not installed")
+        return BACKENDS[name]
+
+    for backend in BACKEND_ORDER:
+        if is_available(backend):
+            return BACKENDS[backend]
+    raise ImportError("No HTML parser backend is installed, install beautifulsoup4")
+
+def parse_schedule(html, table_ids, lesson_types, backend=None):
+    """
+    Parses schedule tables from an HTML page into a list of lessons.
+
+    Parameters:
+        html (str): The page content.
+        table_ids (list): List of table IDs to look for in the HTML.
+        lesson_types (list): List of lesson types to consider.
+        backend (str, optional): The parser backend, see get_backend.
+
+    Returns:
+        list: Tuples of (week_number, weekday, timestamp, subject, type, teacher_names).
+    """
+    return get_backend(backend)(html, table_ids, lesson_types)
@@ -0,0 +1,137 @@
+"""Background schedule refresh that runs on the bot's JobQueue.
+
+The page is fetched with a pooled async HTTP client using conditional
+requests (ETag / If-Modified-Since). Parsing and the database write only
+happen when the page actually changed, and they run in a worker thread so
+the event loop keeps serving updates meanwhile.
+"""
+
+import asyncio
+import hashlib
+import random
+from time import perf_counter
+
+import httpx
+
+import fetch_schedule
+from logger import log_action as log
+
+
+class ScheduleRefresher:
+    def __init__(self, url, table_ids, lesson_types, interval, max_interval,
+                 jitter=0.1, timeout=5, client=None, parser=None, on_change=None):
+        self.url = url  # Schedule page URL
+        self.table_ids = table_ids
+        self.lesson_types = lesson_types
+        self.parser = parser  # HTML parser backend, None picks the fastest installed
+        self.on_change = on_change  # Called with the job queue after the schedule was updated
+
+        # Refresh settings, all in seconds
+        self.interval = interval  # Interval used right after the page changed
+        self.max_interval = max_interval  # Upper bound while the page stays the same
+        self.current_interval = interval
+        self.jitter = jitter  # Relative random spread added to every interval
+
+        # Validators from the last successful response
+        self.etag = None
+        self.last_modified = None
+        self.body_hash = None
+        self.pending = None  # Validators of a fetched page that isn't saved yet
+
+        self.client = client or httpx.AsyncClient(
+            timeout=timeout,
+            follow_redirects=True,
+            limits=httpx.Limits(max_connections=2, max_keepalive_connections=1),
+        )
+        self.job_queue = None
+        self.closed = False
+
+    async def fetch(self):
+        """
+        Fetch the schedule page if it changed since the last fetch.
+
+        Returns:
+            str or None: The page content, None if it has not changed.
+        """
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+
+        response = await self.client.get(self.url, headers=headers)
+        if response.status_code == 304:
+            return None
+        response.raise_for_status()
+
+        # Some servers ignore validators, so compare the body as well
+        validators = (response.headers.get("ETag"), response.headers.get("Last-Modified"),
+                      hashlib.sha256(response.content).hexdigest())
+        if validators[2] == self.body_hash:
+            self.etag, self.last_modified, self.body_hash = validators
+            return None
+        self.pending = validators
+        return response.text
+
+    def commit_validators(self):
+        """Remember the validators of the fetched page once it has been saved."""
+        if self.pending:
+            self.etag, self.last_modified, self.body_hash = self.pending
+            self.pending = None
+
+    async def refresh(self):
+        """
+        Fetch the page and save the schedule if it changed.
+
+        Returns:
+            bool: True if the schedule was updated.
+        """
+        html = await self.fetch()
+        if html is None:
+            return False
+
+        # A failed save raises before the validators are stored, so the page is fetched again next time
+        changed = await asyncio.to_thread(fetch_schedule.save_schedule, html,
+                                          self.table_ids, self.lesson_types, self.parser)
+        self.commit_validators()
+        return changed
+
+    def next_interval(self, changed):
+        """Back off while the page stays the same, return to the base interval on change."""
+        if changed:
+            self.current_interval = self.interval
+        else:
+            self.current_interval = min(self.current_interval * 2, self.max_interval)
+        spread = self.current_interval * self.jitter
+        return self.current_interval + random.uniform(-spread, spread)
+
+    async def callback_refresh(self, context):
+        """JobQueue callback, refreshes the schedule and schedules the next run."""
+        changed = False
+        started = perf_counter()
+        try:
+            changed = await self.refresh()
+            if changed:
+                log("schedule handler", f"Schedule was updated in {perf_counter() - started:.2f}s")
+                if self.on_change:
+                    self.on_change(context.job_queue)
+        except Exception as e:  # Never let a bad page stop future refreshes
+            log("schedule handler", f"Couldn't update the schedule: {e}")
+
+        if not self.closed:
+            context.job_queue.run_once(self.callback_refresh, when=self.next_interval(changed),
+                                       name="schedule_refresh")
+
+    def start(self, job_queue, first=0):
+        """Schedule the first refresh, later ones are scheduled by the job itself."""
+        self.job_queue = job_queue
+        job_queue.run_once(self.callback_refresh, when=first, name="schedule_refresh")
+
+    async def close(self):
+        """Stop refreshing and release the HTTP connection pool."""
+        self.closed = True  # A refresh running right now doesn't schedule the next one
+        if self.job_queue:
+            # Only a pending job can be removed, a running one is already gone from the queue
+            for job in self.job_queue.get_jobs_by_name("schedule_refresh"):
+                job.schedule_removal()
+        await self.client.aclose()
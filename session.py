@@ -0,0 +1,124 @@
+"""Per-chat bot sessions.
+
+Each chat the bot talks to gets its own ChatSession with toggles and
+message ledgers, so chats never overwrite each other's state. Sessions
+are created lazily on the first update from a chat, toggles are loaded
+from and saved to the approved group's data, and idle sessions are
+evicted to keep memory bounded.
+"""
+
+import json
+from time import monotonic
+
+import group_handler
+from autodelete import MessageLedger
+
+
+class ChatSession:
+    def __init__(self, chat_id, settings=None):
+        settings = settings or {}
+        self.chat_id = chat_id
+
+        self.respond = settings.get("respond", True)  # Toggle for bot to respond to user requests
+        self.use_info = settings.get("use_info", False)  # Toggle for extra info in scheduled requests
+        self.autodelete = False  # Toggle to automatically delete message
+
+        self.scheduler = settings.get("scheduler", False)  # Toggle for lesson alerts in this chat
+        self.bot_message_ids = MessageLedger()  # Store bot's message IDs for deletion
+        self.user_message_ids = MessageLedger()  # Store user's message IDs for deletion
+
+        self.last_used = monotonic()
+
+    def settings(self):
+        """Toggles that survive restarts and eviction."""
+        return {"respond": self.respond, "use_info": self.use_info, "scheduler": self.scheduler}
+
+    def is_busy(self):
+        """Sessions pending autodeletion can't be evicted, they still need their message ledgers."""
+        return self.autodelete
+
+
+class SessionStore:
+    def __init__(self, max_idle, max_sessions):
+        self.max_idle = max_idle  # Seconds of inactivity before a session may be evicted
+        self.max_sessions = max_sessions  # Sessions kept in memory before evicting the oldest idle ones
+        self.sessions = {}  # chat_id -> ChatSession, in order of last use
+        self.subscribers = None  # chat_id -> use_info of chats with the scheduler on, loaded on first use
+
+    def get(self, chat_id):
+        """Return the session of a chat, loading it on first use."""
+        session = self.sessions.pop(chat_id, None)
+        if session is None:
+            session = ChatSession(chat_id, self._load_settings(chat_id))
+            if len(self.sessions) >= self.max_sessions:
+                self.evict(force=True)
+        session.last_used = monotonic()
+        self.sessions[chat_id] = session  # Re-inserting keeps the dict ordered by last use
+        return session
+
+    def peek(self, chat_id):
+        """Return the session of a chat if it is in memory, without loading or touching it."""
+        return self.sessions.get(chat_id)
+
+    def save(self, session):
+        """Persist the toggles of a session."""
+        group_handler.set_group_data(session.chat_id, json.dumps(session.settings()))
+
+        # Write-through, so alerts reach chats whose sessions were evicted
+        if self.subscribers is not None:
+            if session.scheduler:
+                self.subscribers[session.chat_id] = session.use_info
+            else:
+                self.subscribers.pop(session.chat_id, None)
+
+    def get_subscribers(self):
+        """
+        Chats that have the scheduler enabled, including ones not in memory.
+
+        Returns:
+            dict: chat_id -> whether the chat wants verbose alerts.
+        """
+        if self.subscribers is None:
+            self.subscribers = {}
+            for group_name, group_data in group_handler.get_groups_as_dict().items():
+                try:
+                    settings = json.loads(group_data or "{}")
+                    chat_id = int(group_name)
+                except ValueError:
+                    continue
+                if settings.get("scheduler"):
+                    self.subscribers[chat_id] = settings.get("use_info", False)
+        return self.subscribers
+
+    def evict(self, force=False):
+        """
+        Drop idle sessions that have nothing running.
+
+        Parameters:
+            force (bool): Also drop the least recently used non-busy session,
+                even if not idle yet, when the store is full.
+
+        Returns:
+            int: Number of evicted sessions.
+        """
+        now = monotonic()
+        evicted = [chat_id for chat_id, session in self.sessions.items()
+                   if now - session.last_used > self.max_idle and not session.is_busy()]
+        if force and not evicted:
+            evicted = [next((chat_id for chat_id, session in self.sessions.items()
+                             if not session.is_busy()), None)]
+        for chat_id in evicted:
+            self.sessions.pop(chat_id, None)
+        return len([chat_id for chat_id in evicted if chat_id is not None])
+
+    def values(self):
+        """All sessions currently in memory."""
+        return list(self.sessions.values())
+
+    @staticmethod
+    def _load_settings(chat_id):
+        """Load saved toggles of a chat, empty if there are none."""
+        try:
+            return json.loads(group_handler.get_group_data(chat_id) or "{}")
+        except ValueError:
+            return {}
@@ -0,0 +1,20 @@
+"""Timing of the bot startup phases, reported once the bot is up."""
+
+from time import perf_counter
+
+_begin = perf_counter()
+_last = _begin
+timings = []  # (phase, seconds) pairs in the order they happened
+
+
+def mark(phase):
+    """Record the time spent since the previous mark under the given phase name."""
+    global _last
+    now = perf_counter()
+    timings.append((phase, now - _last))
+    _last = now
+
+def report():
+    """Return a one-line summary of where the startup time went."""
+    phases = ", ".join(f"{phase} {seconds:.3f}s" for phase, seconds in timings)
+    return f"Startup took {_last - _begin:.3f}s ({phases})"
@@ -0,0 +1,73 @@
+"""Splitting long messages into chunks Telegram accepts.
+
+Run from the repository root: python -m unittest discover tests
+"""
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import chunker  # noqa: E402
+
+
+def day(name, lessons, width=20):
+    """A rendered day block: a header line and one line per lesson."""
+    return "\n".join([f"*{name}:*"] + [f"\t{index}: " + "x" * width for index in range(lessons)])
+
+
+class SplitMessageTest(unittest.TestCase):
+    def test_short_message_is_kept_whole(self):
+        text = day("Monday", 3)
+        self.assertEqual(chunker.split_message(text), [text])
+
+    def test_split_between_days(self):
+        days = [day(name, 3) for name in ("Monday", "Tuesday", "Wednesday", "Thursday")]
+        text = "\n\n".join(days)
+        limit = len(days[0]) * 2 + 10  # Two days fit, three don't
+
+        chunks = chunker.split_message(text, limit)
+        self.assertEqual(chunks, ["\n\n".join(days[:2]), "\n\n".join(days[2:])])
+
+    def test_day_too_long_is_split_between_lines(self):
+        long_day = day("Monday", 10)
+        text = long_day + "\n\n" + day("Tuesday", 1)
+        limit = len(long_day) // 2
+
+        chunks = chunker.split_message(text, limit)
+        self.assertGreater(len(chunks), 2)
+        self.assertTrue(all(chunker.message_length(chunk) <= limit for chunk in chunks))
+        # No line is cut and the order is kept
+        self.assertEqual([line for chunk in chunks for line in chunk.split("\n") if line],
+                         [line for line in text.split("\n") if line])
+
+    def test_line_too_long_is_cut(self):
+        line = "y" * 25
+        chunks = chunker.split_message(line, 10)
+        self.assertEqual(chunks, ["y" * 10, "y" * 10, "y" * 5])
+
+    def test_limit_counts_utf16_units(self):
+        # Emoji outside the BMP take two UTF-16 code units, Cyrillic letters one
+        self.assertEqual(chunker.message_length("😀"), 2)
+        self.assertEqual(chunker.message_length("пара"), 4)
+
+        fits = "😀" * (chunker.MESSAGE_LIMIT // 2)
+        self.assertEqual(chunker.split_message(fits), [fits])
+        cyrillic = "я" * chunker.MESSAGE_LIMIT
+        self.assertEqual(chunker.split_message(cyrillic), [cyrillic])
+
+        too_long = "😀" * (chunker.MESSAGE_LIMIT // 2 + 1)
+        chunks = chunker.split_message(too_long)
+        self.assertEqual(len(chunks), 2)
+        self.assertTrue(all(chunker.message_length(chunk) <= chunker.MESSAGE_LIMIT for chunk in chunks))
+        self.assertEqual("".join(chunks), too_long)
+
+    def test_cut_never_splits_a_surrogate_pair(self):
+        # 3 units left for the second emoji of a chunk, it goes whole into the next one
+        chunks = chunker.split_message("😀" * 4, 5)
+        self.assertEqual(chunks, ["😀😀", "😀😀"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,84 @@
+"""Parsing inline queries and reusing built result sets.
+
+Run from the repository root: python -m unittest discover tests
+"""
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import inline_results  # noqa: E402
+from inline_results import NOW, TODAY, WEEK  # noqa: E402
+
+
+class ParseQueryTest(unittest.TestCase):
+    def test_empty_query_matches_everything(self):
+        self.assertEqual(inline_results.parse_query(""), [(NOW, None), (TODAY, None), (WEEK, None)])
+        self.assertEqual(inline_results.parse_query("   "), [(NOW, None), (TODAY, None), (WEEK, None)])
+
+    def test_partly_typed_word(self):
+        self.assertEqual(inline_results.parse_query("to"), [(TODAY, None)])
+        self.assertEqual(inline_results.parse_query("NO"), [(NOW, None)])
+
+    def test_week_number(self):
+        self.assertEqual(inline_results.parse_query("week 2"), [(WEEK, 2)])
+        self.assertEqual(inline_results.parse_query("w 1"), [(WEEK, 1)])
+
+    def test_unknown_week_number_means_current_week(self):
+        self.assertEqual(inline_results.parse_query("week 9"), [(WEEK, None)])
+        self.assertEqual(inline_results.parse_query("week two"), [(WEEK, None)])
+
+    def test_nonsense(self):
+        self.assertEqual(inline_results.parse_query("lunch"), [])
+        self.assertEqual(inline_results.parse_query("2 week"), [])
+
+
+class InlineResultsTest(unittest.TestCase):
+    def setUp(self):
+        self.texts = {(NOW, None): "*Now:* nothing", (WEEK, 1): "*Monday:*\n\tlesson"}
+        self.rendered = []
+
+        def render(msg_type, week):
+            self.rendered.append((msg_type, week))
+            return self.texts[(msg_type, week)]
+
+        self.inline = inline_results.InlineResults(render, ["Now", "Today", "Week"])
+
+    def test_results(self):
+        results = self.inline.get([(WEEK, 1)], version=1)
+        self.assertEqual(len(results), 1)
+        self.assertEqual(results[0].title, "Week 1")
+        self.assertEqual(results[0].input_message_content.message_text, self.texts[(WEEK, 1)])
+
+    def test_result_set_reused_for_the_same_version(self):
+        first = self.inline.get([(NOW, None), (WEEK, 1)], version=1)
+        second = self.inline.get([(NOW, None), (WEEK, 1)], version=1)
+        self.assertEqual([result.id for result in first], [result.id for result in second])
+        self.assertIs(first[0], second[0])
+        self.assertEqual(self.inline.built, 2)
+        self.assertEqual(self.inline.cache.hits, 2)
+
+    def test_result_set_rebuilt_when_the_version_changes(self):
+        first = self.inline.get([(WEEK, 1)], version=1)
+        second = self.inline.get([(WEEK, 1)], version=2)
+        self.assertIsNot(first[0], second[0])
+        self.assertNotEqual(first[0].id, second[0].id)
+        self.assertEqual(self.inline.built, 2)
+
+    def test_result_set_rebuilt_when_the_text_changes(self):
+        first = self.inline.get([(NOW, None)], version=1)
+        self.texts[(NOW, None)] = "*Now:* a lesson"
+        second = self.inline.get([(NOW, None)], version=1)
+        self.assertNotEqual(first[0].id, second[0].id)
+        self.assertEqual(second[0].input_message_content.message_text, "*Now:* a lesson")
+
+    def test_long_message_becomes_numbered_results(self):
+        self.texts[(WEEK, 1)] = "\n\n".join(["*Day:*\n" + "x" * 3000] * 3)
+        results = self.inline.get([(WEEK, 1)], version=1)
+        self.assertEqual([result.title for result in results], ["Week 1 (1/3)", "Week 1 (2/3)", "Week 1 (3/3)"])
+
+
+if __name__ == "__main__":
+    unittest.main()
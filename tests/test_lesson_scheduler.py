@@ -0,0 +1,60 @@
+"""Replanning lesson alerts on a real JobQueue.
+
+Run from the repository root: python -m unittest discover tests
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+import unittest
+from datetime import timedelta
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def setUpModule():
+    # logger opens data/bot.log on import, keep it out of the repository
+    global lesson_scheduler, Application
+    sys.path.insert(0, REPO_ROOT)
+    os.chdir(tempfile.mkdtemp(prefix="calenbot-test-"))
+    os.makedirs("data")
+    import lesson_scheduler
+    from telegram.ext import Application
+
+
+class ReplanTest(unittest.TestCase):
+    def test_replan_after_an_alert_fired(self):
+        fired = []
+
+        async def alert(context):
+            fired.append(context.job.data)
+
+        async def run():
+            app = Application.builder().token("1:test").build()  # The job queue only holds a weak reference
+            job_queue = app.job_queue
+            await job_queue.start()
+            try:
+                scheduler = lesson_scheduler.LessonScheduler(["08:30"], ["Monday"], "Europe/Kyiv",
+                                                             lead=0, callback=alert)
+                now = scheduler.now()
+                scheduler.alerts_for = lambda day: [(now + timedelta(seconds=0.1), (0, 0, 1)),
+                                                    (now + timedelta(hours=1), (1, 0, 1))]
+                scheduler.plan(job_queue, now)
+                await asyncio.sleep(0.5)
+                self.assertEqual(fired, [(0, 0, 1)])
+
+                # The fired job is gone from the queue, replanning must not trip over it
+                scheduler.alerts_for = lambda day: [(now + timedelta(hours=2), (2, 0, 1))]
+                scheduler.plan(job_queue, now)
+                await asyncio.sleep(0)
+                planned = [job.data for job in job_queue.get_jobs_by_name("lesson_alert")]
+                self.assertEqual(planned, [(2, 0, 1)])
+            finally:
+                await job_queue.stop()
+
+        asyncio.run(run())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,100 @@
+"""Lookup of the current lesson slot.
+
+The lesson start times are compiled once per day into the moments the
+answer can change: when the first alert goes out and when every lesson
+ends. Finding the current lesson is then one clock read and one bisect,
+the day is only compiled again after midnight in the configured timezone.
+"""
+
+from bisect import bisect_right
+from datetime import datetime, timedelta, time as dt_time
+from time import time
+from zoneinfo import ZoneInfo
+
+
+NO_LESSON = 100  # Lesson index outside of any schedule, form_schedule renders nothing for it
+
+
+def week_number(day):
+    """Week of the two-week schedule a date falls into."""
+    return 2 if day.isocalendar()[1] % 2 == 1 else 1
+
+
+class TimeSlots:
+    def __init__(self, timestamps, lesson_length, lead, timezone):
+        """
+        Parameters:
+            timestamps (list): Lesson start times in HH:MM format, in order.
+            lesson_length (int): Length of a lesson in seconds.
+            lead (int): Seconds before the first lesson when the day's lessons begin to count.
+            timezone (str): IANA name of the timezone the timestamps are in.
+        """
+        self.timezone = ZoneInfo(timezone)
+        self.starts = [datetime.strptime(timestamp, "%H:%M").time() for timestamp in timestamps]
+        self.lesson_length = timedelta(seconds=lesson_length)
+        self.lead = timedelta(seconds=lead)
+
+        # Compiled day, all moments as Unix timestamps
+        self.day_start = None
+        self.day_end = None
+        self.opens = None  # Before this there is no current lesson
+        self.ends = []  # End of every lesson, the current one is the first not yet ended
+        self.day_index = None
+        self.week = None
+
+    def _compile(self, now):
+        """Compile the slot boundaries of the day now falls into."""
+        day = datetime.fromtimestamp(now, self.timezone).date()
+        midnight = datetime.combine(day, dt_time(), tzinfo=self.timezone)
+        starts = [datetime.combine(day, start, tzinfo=self.timezone) for start in self.starts]
+
+        self.day_start = midnight.timestamp()
+        self.day_end = datetime.combine(day + timedelta(days=1), dt_time(), tzinfo=self.timezone).timestamp()
+        self.opens = (starts[0] - self.lead).timestamp() if starts else self.day_end
+        self.ends = [(start + self.lesson_length).timestamp() for start in starts]
+        self.day_index = day.weekday()
+        self.week = week_number(day)
+
+    def _ensure(self, now):
+        if self.day_start is None or not self.day_start <= now < self.day_end:
+            self._compile(now)
+
+    def details(self, now=None):
+        """
+        Get the current lesson, day and week.
+
+        Between lessons, the current lesson is the next one, so it's
+        announced as soon as the previous one ends.
+
+        Parameters:
+            now (float, optional): Unix timestamp, the current time by default.
+
+        Returns:
+            tuple: Lesson index (NO_LESSON outside of the day's lessons), weekday index, week number.
+        """
+        now = time() if now is None else now
+        self._ensure(now)
+        lesson_index = bisect_right(self.ends, now)
+        if now < self.opens or lesson_index >= len(self.ends):
+            lesson_index = NO_LESSON
+        return lesson_index, self.day_index, self.week
+
+    def next_boundary(self, now=None):
+        """
+        Get the moment when details will next change its result.
+
+        Returns:
+            float: Unix timestamp of the next boundary, at most the next midnight.
+        """
+        now = time() if now is None else now
+        self._ensure(now)
+        if now < self.opens:
+            return self.opens
+        lesson_index = bisect_right(self.ends, now)
+        return self.ends[lesson_index] if lesson_index < len(self.ends) else self.day_end
+
+    def day_end_at(self, now=None):
+        """Unix timestamp of the next midnight."""
+        now = time() if now is None else now
+        self._ensure(now)
+        return self.day_end
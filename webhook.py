@@ -0,0 +1,106 @@
+"""Webhook delivery of updates.
+
+Instead of long-polling getUpdates, Telegram posts every update to the
+bot's own HTTP endpoint, served by http_server on the bot's event loop.
+Requests must carry the secret token given to setWebhook. Updates are
+put on the application's update queue and answered right away, the
+application processes them concurrently. A health endpoint tells a
+load balancer or a supervisor that the bot is up.
+"""
+
+import asyncio
+import hmac
+import json
+import secrets
+import signal
+
+from telegram import Update
+
+from logger import log_action as log
+from http_server import HTTPServer
+from metrics import registry
+
+
+SECRET_HEADER = "x-telegram-bot-api-secret-token"
+
+
+class Webhook:
+    def __init__(self, app, host, port, path, url=None, secret=None, max_connections=40):
+        """
+        Parameters:
+            app (telegram.ext.Application): The bot application.
+            host (str): Address to listen on.
+            port (int): Port to listen on.
+            path (str): Path Telegram posts updates to.
+            url (str, optional): Public URL of the endpoint to register with Telegram,
+                None leaves the registered webhook alone (e.g. when testing locally).
+            secret (str, optional): Secret token, generated if not given. Required without url,
+                a generated one would never reach Telegram and every update would be rejected.
+            max_connections (int): Concurrent connections Telegram may open.
+        """
+        if not url and not secret:
+            raise ValueError("Webhook without a URL needs a secret, set WEBHOOK_SECRET or WEBHOOK_URL")
+        self.app = app
+        self.url = url
+        self.secret = secret or secrets.token_urlsafe(32)
+        self.max_connections = max_connections
+        self.server = HTTPServer(host, port, {
+            ("POST", path): self.handle_update,
+            ("GET", "/health"): self.health,
+        })
+
+    async def handle_update(self, request):
+        if not hmac.compare_digest(request.headers.get(SECRET_HEADER, "").encode(), self.secret.encode()):
+            registry.inc("calenbot_webhook_updates_total", (("result", "forbidden"),))
+            return 403, "text/plain", "Forbidden"
+        try:
+            update = Update.de_json(json.loads(request.body), self.app.bot)
+        except Exception:
+            registry.inc("calenbot_webhook_updates_total", (("result", "invalid"),))
+            return 400, "text/plain", "Invalid update"
+        await self.app.update_queue.put(update)
+        registry.inc("calenbot_webhook_updates_total", (("result", "accepted"),))
+        return 200, "text/plain", ""
+
+    async def health(self, request):
+        status = 200 if self.app.running else 503
+        body = json.dumps({"running": self.app.running, "pending_updates": self.app.update_queue.qsize()})
+        return status, "application/json", body
+
+    async def start(self):
+        await self.server.start()
+        if self.url:
+            await self.app.bot.set_webhook(self.url, secret_token=self.secret,
+                                           allowed_updates=Update.ALL_TYPES,
+                                           max_connections=self.max_connections)
+            log("bot handler", f"Webhook set to {self.url}")
+
+    async def close(self):
+        await self.server.close()
+
+    async def run(self):
+        """Run the application on the webhook until SIGINT or SIGTERM."""
+        app = self.app
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(signum, stop.set)
+
+        # The same order of hooks as Application.run_polling
+        await app.initialize()
+        if app.post_init:
+            await app.post_init(app)
+        try:
+            await app.start()
+            await self.start()
+            await stop.wait()
+        finally:
+            await self.close()
+            if app.running:
+                await app.stop()
+                if app.post_stop:
+                    await app.post_stop(app)
+            await app.shutdown()
+            if app.post_shutdown:
+                await app.post_shutdown(app)
+